@@ -0,0 +1,258 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import g, jsonify, request
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+# Admission control, in front of every route:
+#
+#   - Rate limits: token buckets per route class. A request takes its class's cost in tokens
+#     and each bucket refills at its class's rate up to its burst; a request that finds a
+#     bucket dry gets 429 with Retry-After set to when the tokens will be back. Every request
+#     draws on two buckets: its caller's, and its client address's, which is
+#     ADMISSION_ADDRESS_SCALE times larger so that many users behind one NAT or proxy fit.
+#     The API has no sessions yet, so a caller is what the client says it is (the email for
+#     login and register, otherwise the user_id in the path, query or JSON body) at its
+#     address: claiming another user's id can't drain that user's bucket, and rotating ids
+#     still runs into the address's.
+#     Behind reverse proxies, set ADMISSION_TRUSTED_PROXIES to how many there are, so the
+#     address comes from X-Forwarded-For (werkzeug's ProxyFix) rather than being the proxy's.
+#   - Load shedding: "analytics" routes (aggregations, exports, bulk imports, and transaction
+#     lists across all users) also need one of ADMISSION_EXPENSIVE_CONCURRENCY slots in this
+#     process, held until the response has been sent. Requests wait for a slot in a queue
+#     of at most ADMISSION_QUEUE_DEPTH for up to ADMISSION_QUEUE_TIMEOUT_MS; when the queue is
+#     full, the wait times out, or these routes are averaging over ADMISSION_SHED_LATENCY_MS
+#     and every slot is taken, the request is turned away with 503 and Retry-After.
+#
+# Outcomes per class are counted on /metrics. Buckets live in a backend created by
+# ADMISSION_BACKEND_FACTORY(config); the default keeps them in this process's memory, so each
+# worker enforces the limits on its own. A shared backend (e.g. Redis) only has to implement
+# take() as MemoryBackend does, atomically.
+
+ROUTE_CLASSES = {
+    # (rule, method) -> class; everything else is "write" for POST/PUT/DELETE and "list" for GET
+    ("/register", "POST"): "auth",
+    ("/login", "POST"): "auth",
+    ("/predictive-analysis", "GET"): "analytics",
+    ("/analytics/spending", "GET"): "analytics",
+    ("/budgets/status", "GET"): "analytics",
+    ("/users/<user_id>/summary", "GET"): "analytics",
+    ("/transactions/export", "GET"): "analytics",
+    ("/transactions/bulk", "POST"): "analytics",
+    ("/metrics", "GET"): None,  # Not limited
+    ("/pool-stats", "GET"): None,
+}
+UNSCOPED_CLASSES = {
+    # (rule, method) -> class when the request names no user_id, i.e. reads across all users
+    ("/transactions", "GET"): "analytics",
+}
+EXPENSIVE_CLASSES = ("analytics",)
+
+DEFAULTS = {
+    "ADMISSION_ENABLED": True,
+    # Tokens per request, tokens per second and bucket size, per class
+    "ADMISSION_CLASSES": {
+        "analytics": {"cost": 10, "rate": 10, "burst": 100},  # 1 per second, 10 at once
+        "list": {"cost": 2, "rate": 20, "burst": 200},        # 10 per second, 100 at once
+        "write": {"cost": 1, "rate": 10, "burst": 100},       # 10 per second, 100 at once
+        "auth": {"cost": 1, "rate": 0.2, "burst": 10},        # 12 per minute, 10 at once
+    },
+    "ADMISSION_EXPENSIVE_CONCURRENCY": 8,
+    "ADMISSION_QUEUE_DEPTH": 16,
+    "ADMISSION_QUEUE_TIMEOUT_MS": 2000,
+    "ADMISSION_SHED_LATENCY_MS": 2000,
+    "ADMISSION_ADDRESS_SCALE": 50,  # An address's buckets are this many callers' worth
+    "ADMISSION_TRUSTED_PROXIES": 0,  # Reverse proxies in front that append to X-Forwarded-For
+    "ADMISSION_BACKEND_FACTORY": lambda config: MemoryBackend(),
+}
+LATENCY_SMOOTHING = 0.2  # Weight of the newest request in the moving average latency
+CALLER_BODY_LIMIT = 64 * 1024  # Larger JSON bodies (bulk imports) aren't parsed to find the caller
+
+
+class MemoryBackend:
+    # Token buckets in a dict, least recently used first. A bucket that is dropped to stay under
+    # max_keys comes back full, which only errs towards admitting.
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, cost, rate, burst):
+        # Returns (admitted, seconds until cost tokens are available)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            admitted = tokens >= cost
+            if admitted:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return admitted, 0 if admitted else (cost - tokens) / rate
+
+
+class Gate:
+    # Concurrency limit with a bounded wait queue for the expensive routes of this process
+    def __init__(self, limit, queue_depth, timeout, shed_latency):
+        self.limit = limit
+        self.queue_depth = queue_depth
+        self.timeout = timeout
+        self.shed_latency = shed_latency
+        self.in_flight = 0
+        self.waiting = 0
+        self.latency = 0.0  # Moving average, seconds
+        self._condition = threading.Condition()
+
+    def enter(self):
+        # Returns None when admitted, otherwise the reason the request is shed
+        with self._condition:
+            if self.in_flight < self.limit:
+                self.in_flight += 1
+                return None
+            if self.latency > self.shed_latency:
+                return "latency"
+            if self.waiting >= self.queue_depth:
+                return "queue_full"
+            self.waiting += 1
+            try:
+                if not self._condition.wait_for(lambda: self.in_flight < self.limit, self.timeout):
+                    return "queue_timeout"
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            return None
+
+    def leave(self, seconds):
+        with self._condition:
+            self.in_flight -= 1
+            self.latency += LATENCY_SMOOTHING * (seconds - self.latency)
+            self._condition.notify()
+
+    def retry_after(self):
+        # Roughly how long until the queue ahead has drained
+        return max(1, math.ceil(self.latency * (self.waiting + 1) / self.limit))
+
+
+class Admission:
+    def __init__(self, app=None):
+        self.outcomes = {}  # (class, outcome) -> count
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        for key, value in DEFAULTS.items():
+            app.config.setdefault(key, value)
+        self.config = app.config
+        self.backend = app.config["ADMISSION_BACKEND_FACTORY"](app.config)
+        self.gate = Gate(
+            app.config["ADMISSION_EXPENSIVE_CONCURRENCY"],
+            app.config["ADMISSION_QUEUE_DEPTH"],
+            app.config["ADMISSION_QUEUE_TIMEOUT_MS"] / 1000,
+            app.config["ADMISSION_SHED_LATENCY_MS"] / 1000
+        )
+        app.extensions["admission"] = self
+        if "metrics" in app.extensions:
+            app.extensions["metrics"].registry.collectors.append(self.render)
+        if app.config["ADMISSION_TRUSTED_PROXIES"]:
+            app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["ADMISSION_TRUSTED_PROXIES"])
+        if app.config["ADMISSION_ENABLED"]:
+            app.before_request(self.before_request)
+            app.after_request(self.after_request)
+            app.teardown_request(self.teardown_request)
+
+    def count(self, route_class, outcome):
+        with self._lock:
+            self.outcomes[(route_class, outcome)] = self.outcomes.get((route_class, outcome), 0) + 1
+
+    def before_request(self):
+        if request.url_rule is None:
+            return None
+        key = (request.url_rule.rule, request.method)
+        if key in UNSCOPED_CLASSES and not request.args.get("user_id"):
+            route_class = UNSCOPED_CLASSES[key]
+        elif key in ROUTE_CLASSES:
+            route_class = ROUTE_CLASSES[key]
+        else:
+            route_class = "list" if request.method in ("GET", "HEAD", "OPTIONS") else "write"
+        if route_class is None:
+            return None
+
+        limits = self.config["ADMISSION_CLASSES"][route_class]
+        scale = self.config["ADMISSION_ADDRESS_SCALE"]
+        address = request.remote_addr
+        buckets = (
+            (f"{route_class}:address:{address}", limits["rate"] * scale, limits["burst"] * scale),
+            (f"{route_class}:{caller(route_class)}@{address}", limits["rate"], limits["burst"]),
+        )
+        for bucket, rate, burst in buckets:
+            admitted, wait = self.backend.take(bucket, limits["cost"], rate, burst)
+            if not admitted:
+                self.count(route_class, "throttled")
+                return refuse(429, "Too many requests, slow down", wait)
+
+        if route_class in EXPENSIVE_CLASSES:
+            reason = self.gate.enter()
+            if reason is not None:
+                self.count(route_class, f"shed_{reason}")
+                return refuse(503, "Server busy, try again shortly", self.gate.retry_after())
+            g.admission_started = time.perf_counter()
+        self.count(route_class, "admitted")
+        return None
+
+    def after_request(self, response):
+        # The slot is held until the body has been sent, which for a streamed export is long
+        # after the view returned
+        started = g.pop("admission_started", None)
+        if started is not None:
+            response.call_on_close(lambda: self.gate.leave(time.perf_counter() - started))
+        return response
+
+    def teardown_request(self, exc):
+        # Only when no response was produced to release the slot on close
+        started = g.pop("admission_started", None)
+        if started is not None:
+            self.gate.leave(time.perf_counter() - started)
+
+    def render(self, lines):
+        lines.append("# HELP spendio_admission_requests_total Admission decisions, by route class and outcome")
+        lines.append("# TYPE spendio_admission_requests_total counter")
+        with self._lock:
+            for (route_class, outcome), count in sorted(self.outcomes.items()):
+                lines.append(f'spendio_admission_requests_total{{class="{route_class}",outcome="{outcome}"}} {count}')
+        gauges = (
+            ("spendio_admission_in_flight", "Expensive requests running", self.gate.in_flight),
+            ("spendio_admission_queued", "Expensive requests waiting for a slot", self.gate.waiting),
+            ("spendio_admission_latency_seconds", "Moving average latency of expensive requests", self.gate.latency),
+        )
+        for name, help_text, value in gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+
+
+def caller(route_class):
+    # Who the client says it is; empty when it doesn't say, leaving only its address
+    body = None
+    if request.is_json and (request.content_length or 0) <= CALLER_BODY_LIMIT:
+        body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        body = {}
+    if route_class == "auth":
+        return f"email:{str(body.get('email') or '').strip().lower()}"
+    if request.view_args and request.view_args.get("user_id"):
+        return f"user:{request.view_args['user_id']}"
+    if request.args.get("user_id"):
+        return f"user:{request.args['user_id']}"
+    if body.get("userId"):
+        return f"user:{body['userId']}"
+    return ""
+
+
+def refuse(status, message, retry_after):
+    response = jsonify({"message": message})
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
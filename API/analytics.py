@@ -0,0 +1,221 @@
+import math
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from fx import BASE_CURRENCY
+from storage import parse_datetime, to_float
+
+# Time-bucketed spending series for charts (GET /analytics/spending). Each (user, granularity,
+# bucket) is computed once and kept in the analytics_buckets collection with both of its
+# groupings, by category (spending only, Income excluded) and by transaction type:
+#
+#     {userId, granularity: "month", start: 2024-05-01, version: 0, stale: false,
+#      category: [{key: "Food", count: 9, amounts: [{currency: "LKR", total: 1250.5}]}, ...],
+#      type: [...]}
+#
+# Amounts are kept per currency as spent, and converted to the reporting currency when
+# read (to_currency), at each bucket's average rates, so rate updates never invalidate them.
+#
+# A bucket is only stored once it has closed; the open one (containing now) and any future
+# ones are recomputed on every read. Transaction writes don't recompute anything: they mark
+# the buckets their dates fall in as stale and bump the bucket's version, and the next read
+# recomputes just those. A read stores a bucket only if its version is still the one it saw,
+# so a write that lands mid-computation is never overwritten by the older result.
+#
+# Buckets are UTC; weeks start on Monday, as $dateTrunc (MongoDB 5.0+) counts them with
+# startOfWeek "monday".
+
+GRANULARITIES = ("day", "week", "month")
+GROUPINGS = ("category", "type")
+BUCKETS = "analytics_buckets"
+DEFAULT_BUCKETS = {"day": 30, "week": 26, "month": 12}  # Window ending with the open bucket
+MAX_BUCKETS = 1100  # Three years of days
+BUCKET_FORMAT = 2  # Stored buckets of any other format are recomputed
+
+
+def bucket_start(moment, granularity):
+    day = datetime(moment.year, moment.month, moment.day)
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def shift(start, granularity, count):
+    # The bucket start count buckets away from start (which must be a bucket start)
+    if granularity == "day":
+        return start + timedelta(days=count)
+    if granularity == "week":
+        return start + timedelta(weeks=count)
+    months = start.year * 12 + start.month - 1 + count
+    return datetime(months // 12, months % 12 + 1, 1)
+
+
+def bucket_starts(start, end, granularity):
+    # Every bucket overlapping [start, end)
+    starts = []
+    current = bucket_start(start, granularity)
+    while current < end and len(starts) <= MAX_BUCKETS:
+        starts.append(current)
+        current = shift(current, granularity, 1)
+    return starts
+
+
+def invalidate(buckets, transactions):
+    # Called after transactions are written or deleted, with the documents as they were stored
+    keys = set()
+    for transaction in transactions:
+        try:
+            moment = parse_datetime(transaction.get("date"))
+        except ValueError:
+            continue
+        for granularity in GRANULARITIES:
+            keys.add((transaction.get("userId"), granularity, bucket_start(moment, granularity)))
+    operations = [
+        UpdateOne(
+            {"userId": user_id, "granularity": granularity, "start": start},
+            {"$inc": {"version": 1}, "$set": {"stale": True}},
+            upsert=True
+        )
+        for user_id, granularity, start in keys if user_id is not None
+    ]
+    if operations:
+        buckets.bulk_write(operations, ordered=False)
+
+
+def compute(transactions, user_id, granularity, starts):
+    # One aggregation for all the given buckets; consecutive ones become a single date range
+    ranges = []
+    for start in sorted(starts):
+        end = shift(start, granularity, 1)
+        if ranges and ranges[-1]["$lt"] == start:
+            ranges[-1]["$lt"] = end
+        else:
+            ranges.append({"$gte": start, "$lt": end})
+
+    truncate = {"date": "$date", "unit": granularity}
+    if granularity == "week":
+        truncate["startOfWeek"] = "monday"
+    pipeline = [
+        {"$match": {"userId": user_id, "$or": [{"date": date_range} for date_range in ranges]}},
+        {"$group": {
+            "_id": {
+                "start": {"$dateTrunc": truncate},
+                "category": "$category",
+                "type": "$type",
+                "currency": {"$ifNull": ["$currency", BASE_CURRENCY]}
+            },
+            "total": {"$sum": "$amount"},
+            "count": {"$sum": 1}
+        }}
+    ]
+
+    groups = {start: {grouping: {} for grouping in GROUPINGS} for start in starts}
+    for row in transactions.aggregate(pipeline):
+        bucket = groups.get(row["_id"]["start"])
+        if bucket is None:
+            continue
+        total = to_float(row["total"])
+        currency = row["_id"]["currency"]
+        keys = {"type": row["_id"].get("type")}
+        if keys["type"] != "Income":
+            keys["category"] = row["_id"].get("category")
+        for grouping, key in keys.items():
+            group = bucket[grouping].setdefault(key, {"key": key, "count": 0, "amounts": {}})
+            group["count"] += row["count"]
+            group["amounts"][currency] = group["amounts"].get(currency, 0.0) + total
+
+    return {
+        start: {
+            grouping: [
+                {**group, "amounts": [{"currency": currency, "total": total}
+                                      for currency, total in sorted(group["amounts"].items())]}
+                for group in sorted(bucket[grouping].values(), key=lambda group: str(group["key"]))
+            ]
+            for grouping in GROUPINGS
+        }
+        for start, bucket in groups.items()
+    }
+
+
+def store(buckets, user_id, granularity, computed, versions):
+    # Upserts guarded by the version each bucket had when it was read. If a write bumped it
+    # since, the filter misses, the upsert collides with the unique key and the bucket stays stale.
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"userId": user_id, "granularity": granularity, "start": start, "version": versions.get(start, 0)},
+            {"$set": {**bucket, "format": BUCKET_FORMAT, "stale": False, "computedAt": now}},
+            upsert=True
+        )
+        for start, bucket in computed.items()
+    ]
+    if not operations:
+        return
+    try:
+        buckets.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+
+
+def series(buckets, transactions, user_id, granularity, starts, now=None):
+    # Returns {bucket start: {"category": [...], "type": [...]}} for the given starts
+    now = now or datetime.utcnow()
+    cached = {
+        document["start"]: document
+        for document in buckets.find({
+            "userId": user_id, "granularity": granularity, "start": {"$gte": starts[0], "$lte": starts[-1]}
+        })
+    }
+
+    def closed(start):
+        return shift(start, granularity, 1) <= now
+
+    result = {
+        start: {grouping: cached[start].get(grouping, []) for grouping in GROUPINGS}
+        for start in starts
+        if start in cached and not cached[start].get("stale") and cached[start].get("format") == BUCKET_FORMAT
+        and closed(start)
+    }
+    missing = [start for start in starts if start not in result]
+    if missing:
+        computed = compute(transactions, user_id, granularity, missing)
+        store(
+            buckets, user_id, granularity,
+            {start: bucket for start, bucket in computed.items() if closed(start)},
+            {start: cached[start].get("version", 0) for start in missing if start in cached}
+        )
+        result.update(computed)
+    return result
+
+
+def to_currency(table, series, granularity, grouping, currency):
+    # {bucket start: groups} -> ({bucket start: [{key, total, count}]}, currencies without rates),
+    # converting every amount of every bucket in one call
+    entries = [
+        (start, index, amount)
+        for start, bucket in series.items()
+        for index, group in enumerate(bucket[grouping])
+        for amount in group["amounts"]
+    ]
+    converted = table.convert_periods(
+        [amount["total"] for _, _, amount in entries],
+        [amount["currency"] for _, _, amount in entries],
+        [start.toordinal() for start, _, _ in entries],
+        [shift(start, granularity, 1).toordinal() for start, _, _ in entries],
+        currency
+    )
+
+    result = {
+        start: [{"key": group["key"], "total": 0.0, "count": group["count"]} for group in bucket[grouping]]
+        for start, bucket in series.items()
+    }
+    unconverted = set()
+    for (start, index, amount), total in zip(entries, converted.tolist()):
+        if math.isnan(total):
+            unconverted.add(amount["currency"])
+        else:
+            result[start][index]["total"] += total
+    return result, sorted(unconverted)
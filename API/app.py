@@ -1,35 +1,162 @@
-from flask import Flask, request, jsonify
-from pymongo import MongoClient
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, Flask, Response, current_app, request, jsonify
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
-from datetime import datetime, timedelta
-import statistics
-
-app = Flask(__name__)
-
-# Connect to MongoDB
-client = MongoClient("mongodb://localhost:27017/")  # Replace with your connection string if needed
-db = client["finace_app"]
+from werkzeug.local import LocalProxy
+from datetime import datetime, timedelta, timezone
+import csv
+import io
+import math
+import zlib
+import admission
+import analytics
+import cache
+import categories
+import changes
+import fanout
+import fx
+import indexes
+import metrics
+import pagination
+import passwords
+import rollups
+import search
+import serialize
+import storage
+import sync
+from mongo import Mongo
+
+api = Blueprint("api", __name__)
+
+# Creates the app. Settings come from the config mapping, or from FLASK_-prefixed
+# environment variables (e.g. FLASK_MONGO_URI, FLASK_MONGO_MAX_POOL_SIZE=50); see mongo.DEFAULTS.
+# FLASK_SLOW_REQUEST_MS=500 logs requests slower than that with their query shapes; see metrics.py.
+# FLASK_FX_RATES_FILE=/path/rates.csv enables currency conversion (?currency=); see fx.py.
+# Rate limits and load shedding are set with FLASK_ADMISSION_* variables; see admission.DEFAULTS.
+# Nothing connects to MongoDB until the first request in each process needs it.
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config.from_prefixed_env()
+    app.config.update(config or {})
+
+    app.json = serialize.FastJSONProvider(app)
+    Mongo(app)
+    fx.Rates(app)
+    metrics.Metrics(app)
+    admission.Admission(app)
+    passwords.configure(
+        method=app.config.get("PASSWORD_HASH_METHOD"),
+        workers=app.config.get("PASSWORD_HASH_WORKERS")
+    )
+    app.register_blueprint(api)
+    return app
+
+# Helper function to reach a collection of the current app's database.
+# The proxy resolves on every use, so it always goes through this process's client.
+def app_collection(name):
+    return LocalProxy(lambda: current_app.extensions["mongo"].db[name])
 
 # Collections
-users_collection = db["users"]
-transactions_collection = db["transactions"]
-budgets_collection = db["budgets"]
-predictions_collection = db["predictions"]
-goals_collection = db["goals"]
-
-# Helper function to format MongoDB documents
-def format_document(document):
-    document["_id"] = str(document["_id"])  # Convert ObjectId to string
-    if "date" in document:
-        document["date"] = document["date"]  # Already a string from client
-    if "deadline" in document:
-        document["deadline"] = document["deadline"]  # Already a string from client
-    return document
+users_collection = app_collection("users")
+transactions_collection = app_collection("transactions")
+budgets_collection = app_collection("budgets")
+predictions_collection = app_collection("predictions")
+goals_collection = app_collection("goals")
+rollups_collection = app_collection("spending_rollups")
+counters_collection = app_collection("change_counters")
+tombstones_collection = app_collection(sync.TOMBSTONES)
+analytics_collection = app_collection(analytics.BUCKETS)
+category_usage_collection = app_collection(categories.USAGE)
+
+# Fields never sent back to clients
+USER_HIDDEN_FIELDS = ("password",)
+
+# Helper function to turn a stored timestamp (datetime or ISO string) into an HTTP Last-Modified value
+def http_timestamp(value):
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+# Validators for a single document, from the timestamp of its last write
+def item_validators(document):
+    stamp = document.get("updatedAt") or document.get("createdAt")
+    return f"{document['_id']}-{zlib.crc32(str(stamp).encode()):x}", http_timestamp(stamp)
+
+# Validators for a user's list, from the change counter of that user and collection.
+# The query string is folded in so every page and filter gets its own ETag.
+def list_validators(collection_name, user_id):
+    seq, updated_at = changes.current(counters_collection, collection_name, user_id)
+    return f"{seq}-{zlib.crc32(request.query_string):x}", http_timestamp(updated_at)
+
+# Helper function for conditional GETs: returns a 304 response if the client's
+# If-None-Match (or, without one, If-Modified-Since) still matches, otherwise None
+def not_modified(etag, last_modified):
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    else:
+        fresh = last_modified is not None and request.if_modified_since is not None \
+            and last_modified <= request.if_modified_since
+    if not fresh:
+        return None
+    return set_validators(Response(status=304), etag, last_modified)
+
+def set_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+# Helper function to serve one keyset-paginated page of a list endpoint.
+# Supports ?limit=, ?after= (cursor from the X-Next-After header of the previous page),
+# ?from= (inclusive) and ?to= (exclusive) on date_field, ?category= and ?fields=.
+# Lists scoped to a user carry validators and are answered with 304 before any query.
+# typed_dates: date_field holds BSON dates (see storage.py), so from/to are parsed first.
+def list_page(collection, query, sort, date_field, filter_category=True, user_id=None, hidden=(), typed_dates=False):
+    args = request.args
+    limit = args.get('limit', pagination.DEFAULT_PAGE_SIZE, type=int)
+    if limit is None or not 0 < limit <= pagination.MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {pagination.MAX_PAGE_SIZE}")
+
+    validators = list_validators(collection.name, user_id) if user_id else None
+    if validators:
+        cached = not_modified(*validators)
+        if cached:
+            return cached
+
+    date_range = {}
+    for arg, operator in (('from', "$gte"), ('to', "$lt")):
+        if args.get(arg):
+            date_range[operator] = storage.parse_datetime(args[arg]) if typed_dates else args[arg]
+    if date_range:
+        query[date_field] = date_range
+    if filter_category and args.get('category'):
+        query["category"] = args['category']
+
+    projection = pagination.projection_for(args.get('fields'), sort, hidden)
+    if projection and 1 in projection.values():
+        projection[storage.DATE_FORMATS] = 1
+    documents, next_cursor = pagination.find_page(collection, query, sort, limit, args.get('after'), projection)
+    for document in documents:
+        storage.to_wire(document)
+
+    response = jsonify(documents)
+    if next_cursor:
+        response.headers["X-Next-After"] = next_cursor
+    if validators:
+        set_validators(response, *validators)
+    return response
 
 # ==================== USERS ====================
-@app.route('/register', methods=['POST'])
+@api.route('/register', methods=['POST'])
 def register():
     try:
         data = request.json
@@ -43,7 +170,7 @@ def register():
         if existing_user:
             return jsonify({"message": "Email already registered"}), 409
 
-        hashed_password = generate_password_hash(password)
+        hashed_password = passwords.hash_password(password)
         new_user = {
             "email": email,
             "password": hashed_password,
@@ -56,10 +183,15 @@ def register():
             "user_id": str(result.inserted_id)
         }), 201
 
+    except DuplicateKeyError:
+        # Another registration with the same email won the race; the unique index turned this one away
+        return jsonify({"message": "Email already registered"}), 409
+    except passwords.HashingBusy as e:
+        return jsonify({"message": str(e)}), 503, {"Retry-After": "1"}
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-@app.route('/login', methods=['POST'])
+@api.route('/login', methods=['POST'])
 def login():
     try:
         data = request.json
@@ -70,70 +202,143 @@ def login():
             return jsonify({"message": "Email and password are required"}), 400
 
         user = users_collection.find_one({"email": email})
-        if not user or not check_password_hash(user["password"], password):
+        if not user or not passwords.verify_password(user["password"], password):
             return jsonify({"message": "Invalid email or password"}), 401
 
+        # Upgrade hashes made with an older algorithm or work factor while the plaintext is at hand.
+        # Best effort: when the hashing pool is full the user is still logged in, and the
+        # upgrade waits for a later login.
+        if passwords.needs_rehash(user["password"]):
+            try:
+                users_collection.update_one(
+                    {"_id": user["_id"], "password": user["password"]},
+                    {"$set": {"password": passwords.hash_password(password)}}
+                )
+            except passwords.HashingBusy:
+                pass
+
         return jsonify({
             "message": "Login successful",
             "user_id": str(user["_id"])
         }), 200
 
+    except passwords.HashingBusy as e:
+        return jsonify({"message": str(e)}), 503, {"Retry-After": "1"}
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-@app.route('/users/<user_id>', methods=['GET'])
+@api.route('/users/<user_id>', methods=['GET'])
 def get_user(user_id):
     try:
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
+        user = users_collection.find_one({"_id": ObjectId(user_id)}, {field: 0 for field in USER_HIDDEN_FIELDS})
         if not user:
             return jsonify({"message": "User not found"}), 404
 
-        return jsonify(format_document(user)), 200
+        etag, last_modified = item_validators(user)
+        cached = not_modified(etag, last_modified)
+        if cached:
+            return cached
+        return set_validators(jsonify(user), etag, last_modified), 200
 
     except InvalidId:
         return jsonify({"message": f"'{user_id}' is not a valid ObjectId"}), 400
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-@app.route('/users', methods=['GET'])
+@api.route('/users', methods=['GET'])
 def get_all_users():
     try:
-        users = list(users_collection.find({}))
-        return jsonify([format_document(user) for user in users]), 200
+        return list_page(users_collection, {}, [("_id", 1)], "createdAt", filter_category=False, hidden=USER_HIDDEN_FIELDS)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
 # ==================== TRANSACTIONS ====================
-@app.route('/transactions', methods=['GET'])
+@api.route('/transactions', methods=['GET'])
 def get_transactions():
     try:
         user_id = request.args.get('user_id')
         query = {"userId": user_id} if user_id else {}
-        transactions = list(transactions_collection.find(query))
-        return jsonify([format_document(t) for t in transactions]), 200
+        return list_page(transactions_collection, query, [("date", -1), ("_id", -1)], "date", user_id=user_id,
+                         typed_dates=True)
 
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-@app.route('/transactions', methods=['POST'])
-def add_transaction():
+# Ranked full-text search over a user's notes and categories (see search.py).
+# ?q= takes words, "quoted phrases" and -excluded words; pages work as in list_page
+# (?limit=, ?after= from X-Next-After, ?fields=) and each result carries its "score".
+@api.route('/transactions/search', methods=['GET'])
+def search_transactions():
     try:
-        data = request.json
-        required_fields = ["date", "category", "amount", "userId"]
-        if not all(field in data for field in required_fields):
-            return jsonify({"message": "Date, category, amount, and userId are required"}), 400
+        user_id = request.args.get('user_id')
+        if not user_id:
+            return jsonify({"message": "user_id is required"}), 400
+        text = request.args.get('q', '').strip()
+        if not text:
+            return jsonify({"message": "q is required"}), 400
+        if len(text) > search.MAX_QUERY_LENGTH:
+            return jsonify({"message": f"q must be at most {search.MAX_QUERY_LENGTH} characters"}), 400
+        limit = request.args.get('limit', pagination.DEFAULT_PAGE_SIZE, type=int)
+        if limit is None or not 0 < limit <= pagination.MAX_PAGE_SIZE:
+            return jsonify({"message": f"limit must be between 1 and {pagination.MAX_PAGE_SIZE}"}), 400
+
+        projection = pagination.projection_for(request.args.get('fields'), search.SEARCH_SORT)
+        if projection:
+            projection[storage.DATE_FORMATS] = 1
+        documents, next_cursor = search.search_page(
+            transactions_collection, user_id, text, limit, request.args.get('after'), projection
+        )
+        for document in documents:
+            storage.to_wire(document)
 
-        new_transaction = {
-            "date": data["date"],
-            "userId": data["userId"],
-            "category": data["category"],
-            "amount": float(data["amount"]),
-            "currency": data.get("currency", "LKR"),
-            "note": data.get("note", ""),
-            "type": data.get("type", "Expense"),
-            "createdAt": datetime.utcnow().isoformat() + "Z"
-        }
+        response = jsonify(documents)
+        if next_cursor:
+            response.headers["X-Next-After"] = next_cursor
+        return response
+
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"message": str(e)}), 500
+
+# Helper function to validate a transaction payload and build the document to store.
+# Dates are stored as BSON dates, with the form the client wrote them in, and the amount
+# as Decimal128 (see storage.py).
+# Raises ValueError with the message to send back to the client.
+def build_transaction(data):
+    required_fields = ["date", "category", "amount", "userId"]
+    if not isinstance(data, dict) or not all(field in data for field in required_fields):
+        raise ValueError("Date, category, amount, and userId are required")
+
+    now = datetime.utcnow()
+    date, date_format = storage.parse_client_date(data["date"])
+    return {
+        "date": date,
+        "userId": data["userId"],
+        "category": data["category"],
+        "amount": storage.to_decimal128(data["amount"]),
+        "currency": data.get("currency", "LKR"),
+        "note": data.get("note", ""),
+        "type": data.get("type", "Expense"),
+        "dateFormats": {"date": date_format},
+        "createdAt": now,
+        "updatedAt": now
+    }
+
+@api.route('/transactions', methods=['POST'])
+def add_transaction():
+    try:
+        new_transaction = build_transaction(request.json)
+        sync.stamp_new(counters_collection, [new_transaction])
         result = transactions_collection.insert_one(new_transaction)
+        rollups.add(rollups_collection, new_transaction)
+        analytics.invalidate(analytics_collection, [new_transaction])
+        categories.record(category_usage_collection, added=[new_transaction])
+        changes.bump(counters_collection, "transactions", new_transaction["userId"])
 
         return jsonify({
             "message": "Transaction added successfully",
@@ -141,56 +346,215 @@ def add_transaction():
         }), 201
 
     except ValueError as e:
-        return jsonify({"message": f"Invalid amount: {str(e)}"}), 400
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-@app.route('/transactions/<transaction_id>', methods=['GET'])
+BULK_CHUNK_SIZE = 1000  # Documents per insert_many round trip
+BULK_MAX_ITEMS = 10000  # Transactions per JSON array request; larger loads go in several requests or as NDJSON
+BULK_MAX_BYTES = 16 * 1024 * 1024  # JSON array body size, checked before it is read and parsed whole
+
+@api.route('/transactions/bulk', methods=['POST'])
+def add_transactions_bulk():
+    try:
+        # Accepts a JSON array, or one JSON object per line with Content-Type application/x-ndjson.
+        # An array is parsed whole in memory, so its size is bounded; NDJSON is read line by line.
+        if request.mimetype == "application/x-ndjson":
+            items = parse_ndjson(request.stream)
+        else:
+            if request.content_length is None or request.content_length > BULK_MAX_BYTES:
+                return jsonify({"message": f"JSON array bodies need a Content-Length of at most {BULK_MAX_BYTES} bytes"}), 413
+            items = request.get_json(silent=True)
+            if not isinstance(items, list):
+                return jsonify({"message": "Body must be a JSON array or NDJSON"}), 400
+            if len(items) > BULK_MAX_ITEMS:
+                return jsonify({"message": f"At most {BULK_MAX_ITEMS} transactions per request"}), 413
+
+        results = []
+        chunk = []
+        for index, item in enumerate(items):
+            try:
+                if isinstance(item, ValueError):
+                    raise item
+                chunk.append((index, build_transaction(item)))
+            except ValueError as e:
+                results.append({"index": index, "error": str(e)})
+            if len(chunk) == BULK_CHUNK_SIZE:
+                results.extend(insert_chunk(chunk))
+                chunk = []
+        if chunk:
+            results.extend(insert_chunk(chunk))
+
+        results.sort(key=lambda r: r["index"])
+        inserted = sum(1 for r in results if "transaction_id" in r)
+        return jsonify({
+            "message": f"Inserted {inserted} of {len(results)} transactions",
+            "inserted": inserted,
+            "failed": len(results) - inserted,
+            "results": results
+        }), 201 if inserted == len(results) else 207
+
+    except Exception as e:
+        return jsonify({"message": str(e)}), 500
+
+def parse_ndjson(stream):
+    # Yields one parsed object per non-empty line, or the ValueError for a malformed line
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield serialize.loads(line)
+        except ValueError as e:
+            yield ValueError(f"Invalid JSON: {str(e)}")
+
+def insert_chunk(chunk):
+    documents = [document for _, document in chunk]
+    sync.stamp_new(counters_collection, documents)
+    failed = {}
+    try:
+        transactions_collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        failed = {error["index"]: error["errmsg"] for error in e.details["writeErrors"]}
+
+    inserted = [document for position, document in enumerate(documents) if position not in failed]
+    rollups.add_many(rollups_collection, inserted)
+    analytics.invalidate(analytics_collection, inserted)
+    categories.record(category_usage_collection, added=inserted)
+    user_ids = {document["userId"] for document in inserted}
+    changes.bump(counters_collection, "transactions", *user_ids)
+
+    return [
+        {"index": index, "error": failed[position]} if position in failed
+        else {"index": index, "transaction_id": str(document["_id"])}
+        for position, (index, document) in enumerate(chunk)
+    ]
+
+EXPORT_BATCH_SIZE = 1000  # Documents per cursor batch while streaming an export
+EXPORT_FIELDS = ["_id", "date", "userId", "category", "amount", "currency", "note", "type", "createdAt"]
+
+@api.route('/transactions/export', methods=['GET'])
+def export_transactions():
+    try:
+        user_id = request.args.get('user_id')
+        if not user_id:
+            return jsonify({"message": "user_id is required"}), 400
+
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in ("ndjson", "csv"):
+            return jsonify({"message": "format must be 'ndjson' or 'csv'"}), 400
+
+        query = {"userId": user_id}
+        date_range = {}
+        for arg, operator in (('from', "$gte"), ('to', "$lt")):
+            if request.args.get(arg):
+                date_range[operator] = storage.parse_datetime(request.args[arg])
+        if date_range:
+            query["date"] = date_range
+
+        # Rows are streamed straight off the cursor, one batch at a time, so memory stays flat
+        cursor = transactions_collection.find(query).sort([("date", 1), ("_id", 1)]).batch_size(EXPORT_BATCH_SIZE)
+        rows = stream_csv(cursor) if export_format == "csv" else stream_ndjson(cursor)
+        mimetype = "text/csv" if export_format == "csv" else "application/x-ndjson"
+        return Response(rows, mimetype=mimetype, headers={
+            "Content-Disposition": f"attachment; filename=transactions-{user_id}.{export_format}"
+        })
+
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"message": str(e)}), 500
+
+def stream_ndjson(cursor):
+    lines = []
+    for transaction in cursor:
+        lines.append(serialize.dumps(storage.to_wire(transaction)))
+        if len(lines) == EXPORT_BATCH_SIZE:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+def stream_csv(cursor):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    for count, transaction in enumerate(cursor, 1):
+        writer.writerow({field: serialize.plain(value) for field, value in storage.to_wire(transaction).items()})
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+@api.route('/transactions/<transaction_id>', methods=['GET'])
 def get_transaction(transaction_id):
     try:
         transaction = transactions_collection.find_one({"_id": ObjectId(transaction_id)})
         if not transaction:
             return jsonify({"message": "Transaction not found"}), 404
 
-        return jsonify(format_document(transaction)), 200
+        etag, last_modified = item_validators(transaction)
+        cached = not_modified(etag, last_modified)
+        if cached:
+            return cached
+        return set_validators(jsonify(storage.to_wire(transaction)), etag, last_modified), 200
 
     except InvalidId:
         return jsonify({"message": f"'{transaction_id}' is not a valid ObjectId"}), 400
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-@app.route('/transactions/<transaction_id>', methods=['PUT'])
+@api.route('/transactions/<transaction_id>', methods=['PUT'])
 def update_transaction(transaction_id):
     try:
         data = request.json
-        updated_data = {k: v for k, v in data.items() if v is not None}
+        updated_data = {k: v for k, v in data.items() if v is not None and k != storage.DATE_FORMATS}
         if "amount" in updated_data:
-            updated_data["amount"] = float(updated_data["amount"])
+            updated_data["amount"] = storage.to_decimal128(updated_data["amount"])
+        if "date" in updated_data:
+            updated_data["date"], updated_data["dateFormats.date"] = storage.parse_client_date(updated_data["date"])
+        updated_data["updatedAt"] = datetime.utcnow()
 
-        result = transactions_collection.update_one(
+        previous = transactions_collection.find_one_and_update(
             {"_id": ObjectId(transaction_id)},
-            {"$set": updated_data}
+            {"$set": updated_data},
+            return_document=ReturnDocument.BEFORE
         )
 
-        if result.matched_count == 0:
+        if not previous:
             return jsonify({"message": "Transaction not found"}), 404
 
+        updated = {**previous, **updated_data}
+        rollups.move(rollups_collection, transactions_collection, previous, updated)
+        analytics.invalidate(analytics_collection, [previous, updated])
+        categories.move(category_usage_collection, previous, updated)
+        changes.bump(counters_collection, "transactions", previous["userId"], updated["userId"])
+        sync.stamp_updated(transactions_collection, counters_collection, tombstones_collection,
+                           previous["_id"], previous["userId"], updated["userId"])
+
         return jsonify({"message": "Transaction updated successfully"}), 200
 
     except InvalidId:
         return jsonify({"message": f"'{transaction_id}' is not a valid ObjectId"}), 400
     except ValueError as e:
-        return jsonify({"message": f"Invalid amount: {str(e)}"}), 400
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-@app.route('/transactions/<transaction_id>', methods=['DELETE'])
+@api.route('/transactions/<transaction_id>', methods=['DELETE'])
 def delete_transaction(transaction_id):
     try:
-        result = transactions_collection.delete_one({"_id": ObjectId(transaction_id)})
-        if result.deleted_count == 0:
+        deleted = transactions_collection.find_one_and_delete({"_id": ObjectId(transaction_id)})
+        if not deleted:
             return jsonify({"message": "Transaction not found"}), 404
 
+        rollups.remove(rollups_collection, transactions_collection, deleted)
+        analytics.invalidate(analytics_collection, [deleted])
+        categories.record(category_usage_collection, removed=[deleted])
+        changes.bump(counters_collection, "transactions", deleted["userId"])
+        sync.record_deleted(tombstones_collection, counters_collection, "transactions",
+                            [(deleted["_id"], deleted["userId"])])
+
         return jsonify({"message": "Transaction deleted successfully"}), 200
 
     except InvalidId:
@@ -198,18 +562,164 @@ def delete_transaction(transaction_id):
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
+# ==================== CATEGORIES ====================
+SUGGEST_LIMIT = 10  # Default number of suggestions, overridable with ?limit=
+MAX_SUGGEST_LIMIT = 50
+CATEGORY_CACHE_SIZE = 10000  # Users whose categories are kept in memory
+CATEGORY_CACHE_TTL = 300  # Only bounds memory held for idle users; keys change with the data
+
+category_cache = cache.LRUCache(CATEGORY_CACHE_SIZE, ttl=CATEGORY_CACHE_TTL)
+
+# Completions for a partly typed category, most used first (see categories.py).
+# Called on every keystroke, so a user's categories are read once per change to their
+# transactions (the change counter every worker bumps) and every later prefix is matched in memory.
+@api.route('/categories/suggest', methods=['GET'])
+def suggest_categories():
+    try:
+        user_id = request.args.get('user_id')
+        if not user_id:
+            return jsonify({"message": "user_id is required"}), 400
+        limit = request.args.get('limit', SUGGEST_LIMIT, type=int)
+        if limit is None or not 0 < limit <= MAX_SUGGEST_LIMIT:
+            return jsonify({"message": f"limit must be between 1 and {MAX_SUGGEST_LIMIT}"}), 400
+
+        seq, _ = changes.current(counters_collection, "transactions", user_id)
+        cache_key = (user_id, seq)
+        entries = category_cache.get(cache_key)
+        if entries is None:
+            entries = categories.load(category_usage_collection, user_id)
+            category_cache.set(cache_key, entries)
+
+        return jsonify(categories.suggest(entries, request.args.get('prefix', ''), limit)), 200
+
+    except Exception as e:
+        return jsonify({"message": str(e)}), 500
+
 # ==================== BUDGETS ====================
-@app.route('/budgets', methods=['GET'])
+@api.route('/budgets', methods=['GET'])
 def get_budgets():
     try:
         user_id = request.args.get('user_id')
         query = {"userId": user_id} if user_id else {}
-        budgets = list(budgets_collection.find(query))
-        return jsonify([format_document(b) for b in budgets]), 200
+        return list_page(budgets_collection, query, [("_id", 1)], "createdAt", user_id=user_id, typed_dates=True)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-@app.route('/budgets', methods=['POST'])
+# Spent vs limit for every budget of a user in one month (?period=YYYY-MM, default this month),
+# optionally all in one reporting currency (?currency=). Budgets carry either a standing "limit" or a "monthlyLimit" for one "yearMonth"; a budget
+# without a category covers all spending.
+@api.route('/budgets/status', methods=['GET'])
+def get_budget_status():
+    try:
+        user_id = request.args.get('user_id')
+        if not user_id:
+            return jsonify({"message": "user_id is required"}), 400
+
+        period = request.args.get('period') or datetime.utcnow().strftime("%Y-%m")
+        try:
+            datetime.strptime(period, "%Y-%m")
+        except ValueError:
+            return jsonify({"message": "period must be in YYYY-MM format"}), 400
+
+        currency = request.args.get('currency')
+        if currency:
+            currency = fx.current().require(currency.upper())
+
+        budgets = budgets_collection.aggregate(budget_status_pipeline(user_id, period))
+        return jsonify({"period": period, "budgets": budget_statuses(budgets, period, currency)}), 200
+
+    except fx.UnknownCurrency as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"message": str(e)}), 500
+
+# Helper function to turn budget_status_pipeline() rows into statuses. Spending is reported in
+# each budget's own currency, or with ?currency= everything is, limits included; amounts are
+# converted at the month's average rates, all of them in one call.
+def budget_statuses(budgets, period, currency=None):
+    budgets = list(budgets)
+    start = datetime.strptime(period, "%Y-%m")
+    amounts, sources, targets, owners = [], [], [], []
+    for index, budget in enumerate(budgets):
+        target = currency or budget.get("currency") or fx.BASE_CURRENCY
+        for row in budget["spending"]:
+            amounts.append(storage.to_float(row["spent"]))
+            sources.append(row["_id"]["currency"])
+            targets.append(target)
+            owners.append((index, "spent"))
+        if currency and budget.get("limit") is not None:
+            amounts.append(storage.to_float(budget["limit"]))
+            sources.append(budget.get("currency") or fx.BASE_CURRENCY)
+            targets.append(target)
+            owners.append((index, "limit"))
+    converted = fx.current().convert_periods(
+        amounts, sources, [start.toordinal()] * len(amounts),
+        [analytics.shift(start, "month", 1).toordinal()] * len(amounts), targets
+    )
+
+    totals = [{"spent": 0.0, "limit": budget.get("limit"), "unconverted": set()} for budget in budgets]
+    for (index, field), source, amount in zip(owners, sources, converted.tolist()):
+        if math.isnan(amount):
+            totals[index]["unconverted"].add(source)
+            if field == "limit":
+                totals[index]["limit"] = None
+        elif field == "spent":
+            totals[index]["spent"] += amount
+        else:
+            totals[index]["limit"] = amount
+    return [budget_status(budget, currency, **total) for budget, total in zip(budgets, totals)]
+
+def budget_status(budget, currency, spent, limit, unconverted):
+    status = {
+        "budget_id": str(budget["_id"]),
+        "category": budget.get("category"),
+        "currency": currency or budget.get("currency", "LKR"),
+        "limit": limit,
+        "spent": spent,
+        "remaining": limit - spent if limit is not None else None,
+        "percent_used": round(spent / limit * 100, 1) if limit else None
+    }
+    if unconverted:
+        # Spending in currencies with no rates is left out
+        status["unconverted_currencies"] = sorted(unconverted)
+    return status
+
+def budget_status_pipeline(user_id, period):
+    # The $lookup sub-pipeline doesn't reference the budget, so MongoDB runs it once per
+    # request (not once per budget): one pass over the user's expenses for the month,
+    # grouped by category and currency, which each budget then picks its rows from.
+    # Converting and summing them is left to budget_statuses().
+    return [
+        {"$match": {"userId": user_id, "$or": [{"yearMonth": {"$exists": False}}, {"yearMonth": period}]}},
+        {"$lookup": {
+            "from": "transactions",
+            "pipeline": [
+                {"$match": {"userId": user_id, "date": rollups.month_range(period), "type": {"$ne": "Income"}}},
+                {"$group": {
+                    "_id": {"category": "$category", "currency": {"$ifNull": ["$currency", fx.BASE_CURRENCY]}},
+                    "spent": {"$sum": "$amount"}
+                }}
+            ],
+            "as": "spending"
+        }},
+        {"$project": {
+            "category": 1,
+            "currency": 1,
+            "limit": {"$ifNull": ["$limit", "$monthlyLimit"]},
+            "spending": {"$filter": {
+                "input": "$spending",
+                "as": "row",
+                "cond": {"$or": [
+                    {"$eq": [{"$ifNull": ["$category", None]}, None]},
+                    {"$eq": ["$$row._id.category", "$category"]}
+                ]}
+            }}
+        }}
+    ]
+
+@api.route('/budgets', methods=['POST'])
 def add_budget():
     try:
         data = request.json
@@ -217,14 +727,18 @@ def add_budget():
         if not all(field in data for field in required_fields):
             return jsonify({"message": "Category, limit, and userId are required"}), 400
 
+        now = datetime.utcnow()
         new_budget = {
             "userId": data["userId"],
             "category": data["category"],
             "limit": float(data["limit"]),
             "currency": data.get("currency", "LKR"),
-            "createdAt": datetime.utcnow().isoformat() + "Z"
+            "createdAt": now,
+            "updatedAt": now
         }
+        sync.stamp_new(counters_collection, [new_budget])
         result = budgets_collection.insert_one(new_budget)
+        changes.bump(counters_collection, "budgets", new_budget["userId"])
 
         return jsonify({
             "message": "Budget added successfully",
@@ -236,36 +750,47 @@ def add_budget():
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-@app.route('/budgets/<budget_id>', methods=['GET'])
+@api.route('/budgets/<budget_id>', methods=['GET'])
 def get_budget(budget_id):
     try:
         budget = budgets_collection.find_one({"_id": ObjectId(budget_id)})
         if not budget:
             return jsonify({"message": "Budget not found"}), 404
 
-        return jsonify(format_document(budget)), 200
+        etag, last_modified = item_validators(budget)
+        cached = not_modified(etag, last_modified)
+        if cached:
+            return cached
+        return set_validators(jsonify(storage.to_wire(budget)), etag, last_modified), 200
 
     except InvalidId:
         return jsonify({"message": f"'{budget_id}' is not a valid ObjectId"}), 400
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-@app.route('/budgets/<budget_id>', methods=['PUT'])
+@api.route('/budgets/<budget_id>', methods=['PUT'])
 def update_budget(budget_id):
     try:
         data = request.json
         updated_data = {k: v for k, v in data.items() if v is not None}
         if "limit" in updated_data:
             updated_data["limit"] = float(updated_data["limit"])
+        updated_data["updatedAt"] = datetime.utcnow()
 
-        result = budgets_collection.update_one(
+        previous = budgets_collection.find_one_and_update(
             {"_id": ObjectId(budget_id)},
-            {"$set": updated_data}
+            {"$set": updated_data},
+            projection={"userId": 1}
         )
 
-        if result.matched_count == 0:
+        if not previous:
             return jsonify({"message": "Budget not found"}), 404
 
+        user_id = updated_data.get("userId", previous.get("userId"))
+        changes.bump(counters_collection, "budgets", previous.get("userId"), user_id)
+        sync.stamp_updated(budgets_collection, counters_collection, tombstones_collection,
+                           previous["_id"], previous.get("userId"), user_id)
+
         return jsonify({"message": "Budget updated successfully"}), 200
 
     except InvalidId:
@@ -275,13 +800,17 @@ def update_budget(budget_id):
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-@app.route('/budgets/<budget_id>', methods=['DELETE'])
+@api.route('/budgets/<budget_id>', methods=['DELETE'])
 def delete_budget(budget_id):
     try:
-        result = budgets_collection.delete_one({"_id": ObjectId(budget_id)})
-        if result.deleted_count == 0:
+        deleted = budgets_collection.find_one_and_delete({"_id": ObjectId(budget_id)}, projection={"userId": 1})
+        if not deleted:
             return jsonify({"message": "Budget not found"}), 404
 
+        changes.bump(counters_collection, "budgets", deleted.get("userId"))
+        sync.record_deleted(tombstones_collection, counters_collection, "budgets",
+                            [(deleted["_id"], deleted.get("userId"))])
+
         return jsonify({"message": "Budget deleted successfully"}), 200
 
     except InvalidId:
@@ -290,18 +819,20 @@ def delete_budget(budget_id):
         return jsonify({"message": str(e)}), 500
 
 # ==================== PREDICTIONS ====================
-@app.route('/predictions', methods=['GET'])
+@api.route('/predictions', methods=['GET'])
 def get_predictions():
     try:
         user_id = request.args.get('user_id')
         query = {"userId": user_id} if user_id else {}
-        predictions = list(predictions_collection.find(query))
-        return jsonify([format_document(p) for p in predictions]), 200
+        return list_page(predictions_collection, query, [("_id", 1)], "createdAt", user_id=user_id,
+                         typed_dates=True)
 
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-@app.route('/predictions', methods=['POST'])
+@api.route('/predictions', methods=['POST'])
 def add_prediction():
     try:
         data = request.json
@@ -309,14 +840,18 @@ def add_prediction():
         if not all(field in data for field in required_fields):
             return jsonify({"message": "Category, predicted_amount, and userId are required"}), 400
 
+        now = datetime.utcnow()
         new_prediction = {
             "userId": data["userId"],
             "category": data["category"],
             "predicted_amount": float(data["predicted_amount"]),
             "currency": data.get("currency", "LKR"),
-            "createdAt": datetime.utcnow().isoformat() + "Z"
+            "createdAt": now,
+            "updatedAt": now
         }
+        sync.stamp_new(counters_collection, [new_prediction])
         result = predictions_collection.insert_one(new_prediction)
+        changes.bump(counters_collection, "predictions", new_prediction["userId"])
 
         return jsonify({
             "message": "Prediction added successfully",
@@ -328,36 +863,47 @@ def add_prediction():
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-@app.route('/predictions/<prediction_id>', methods=['GET'])
+@api.route('/predictions/<prediction_id>', methods=['GET'])
 def get_prediction(prediction_id):
     try:
         prediction = predictions_collection.find_one({"_id": ObjectId(prediction_id)})
         if not prediction:
             return jsonify({"message": "Prediction not found"}), 404
 
-        return jsonify(format_document(prediction)), 200
+        etag, last_modified = item_validators(prediction)
+        cached = not_modified(etag, last_modified)
+        if cached:
+            return cached
+        return set_validators(jsonify(storage.to_wire(prediction)), etag, last_modified), 200
 
     except InvalidId:
         return jsonify({"message": f"'{prediction_id}' is not a valid ObjectId"}), 400
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-@app.route('/predictions/<prediction_id>', methods=['PUT'])
+@api.route('/predictions/<prediction_id>', methods=['PUT'])
 def update_prediction(prediction_id):
     try:
         data = request.json
         updated_data = {k: v for k, v in data.items() if v is not None}
         if "predicted_amount" in updated_data:
             updated_data["predicted_amount"] = float(updated_data["predicted_amount"])
+        updated_data["updatedAt"] = datetime.utcnow()
 
-        result = predictions_collection.update_one(
+        previous = predictions_collection.find_one_and_update(
             {"_id": ObjectId(prediction_id)},
-            {"$set": updated_data}
+            {"$set": updated_data},
+            projection={"userId": 1}
         )
 
-        if result.matched_count == 0:
+        if not previous:
             return jsonify({"message": "Prediction not found"}), 404
 
+        user_id = updated_data.get("userId", previous.get("userId"))
+        changes.bump(counters_collection, "predictions", previous.get("userId"), user_id)
+        sync.stamp_updated(predictions_collection, counters_collection, tombstones_collection,
+                           previous["_id"], previous.get("userId"), user_id)
+
         return jsonify({"message": "Prediction updated successfully"}), 200
 
     except InvalidId:
@@ -367,13 +913,17 @@ def update_prediction(prediction_id):
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-@app.route('/predictions/<prediction_id>', methods=['DELETE'])
+@api.route('/predictions/<prediction_id>', methods=['DELETE'])
 def delete_prediction(prediction_id):
     try:
-        result = predictions_collection.delete_one({"_id": ObjectId(prediction_id)})
-        if result.deleted_count == 0:
+        deleted = predictions_collection.find_one_and_delete({"_id": ObjectId(prediction_id)}, projection={"userId": 1})
+        if not deleted:
             return jsonify({"message": "Prediction not found"}), 404
 
+        changes.bump(counters_collection, "predictions", deleted.get("userId"))
+        sync.record_deleted(tombstones_collection, counters_collection, "predictions",
+                            [(deleted["_id"], deleted.get("userId"))])
+
         return jsonify({"message": "Prediction deleted successfully"}), 200
 
     except InvalidId:
@@ -382,20 +932,25 @@ def delete_prediction(prediction_id):
         return jsonify({"message": str(e)}), 500
 
 # ==================== GOALS ====================
-@app.route('/goals', methods=['GET'])
+@api.route('/goals', methods=['GET'])
 def get_goals():
     try:
         user_id = request.args.get('user_id')
         if not user_id:
             return jsonify({"message": "user_id is required"}), 400
         
-        goals = list(goals_collection.find({"userId": user_id}))
-        return jsonify([format_document(g) for g in goals]), 200
+        etag, last_modified = list_validators("goals", user_id)
+        cached = not_modified(etag, last_modified)
+        if cached:
+            return cached
+
+        goals = [storage.to_wire(goal) for goal in goals_collection.find({"userId": user_id})]
+        return set_validators(jsonify(goals), etag, last_modified), 200
 
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-@app.route('/goals', methods=['POST'])
+@api.route('/goals', methods=['POST'])
 def add_goal():
     try:
         data = request.json
@@ -403,21 +958,26 @@ def add_goal():
         if not all(field in data for field in required_fields):
             return jsonify({"message": "userId, title, targetAmount, currentAmount, and deadline are required"}), 400
 
+        now = datetime.utcnow()
+        deadline, deadline_format = storage.parse_client_date(data["deadline"])
         new_goal = {
             "userId": data["userId"],
             "title": data["title"],
             "targetAmount": float(data["targetAmount"]),
             "currentAmount": float(data["currentAmount"]),
-            "deadline": data["deadline"],
+            "deadline": deadline,
             "description": data.get("description", ""),
             "priority": data.get("priority", "Medium"),
             "category": data.get("category", "General"),
             "notifyOnProgress": data.get("notifyOnProgress", False),
             "currency": data.get("currency", "LKR"),
-            "createdAt": datetime.utcnow().isoformat() + "Z",
-            "updatedAt": datetime.utcnow().isoformat() + "Z"
+            "dateFormats": {"deadline": deadline_format},
+            "createdAt": now,
+            "updatedAt": now
         }
+        sync.stamp_new(counters_collection, [new_goal])
         result = goals_collection.insert_one(new_goal)
+        changes.bump(counters_collection, "goals", new_goal["userId"])
 
         return jsonify({
             "message": "Goal added successfully",
@@ -425,59 +985,76 @@ def add_goal():
         }), 201
 
     except ValueError as e:
-        return jsonify({"message": f"Invalid numeric value: {str(e)}"}), 400
+        return jsonify({"message": f"Invalid value: {str(e)}"}), 400
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-@app.route('/goals/<goal_id>', methods=['GET'])
+@api.route('/goals/<goal_id>', methods=['GET'])
 def get_goal(goal_id):
     try:
         goal = goals_collection.find_one({"_id": ObjectId(goal_id)})
         if not goal:
             return jsonify({"message": "Goal not found"}), 404
 
-        return jsonify(format_document(goal)), 200
+        etag, last_modified = item_validators(goal)
+        cached = not_modified(etag, last_modified)
+        if cached:
+            return cached
+        return set_validators(jsonify(storage.to_wire(goal)), etag, last_modified), 200
 
     except InvalidId:
         return jsonify({"message": f"'{goal_id}' is not a valid ObjectId"}), 400
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-@app.route('/goals/<goal_id>', methods=['PUT'])
+@api.route('/goals/<goal_id>', methods=['PUT'])
 def update_goal(goal_id):
     try:
         data = request.json
-        updated_data = {k: v for k, v in data.items() if v is not None}
+        updated_data = {k: v for k, v in data.items() if v is not None and k != storage.DATE_FORMATS}
         if "targetAmount" in updated_data:
             updated_data["targetAmount"] = float(updated_data["targetAmount"])
         if "currentAmount" in updated_data:
             updated_data["currentAmount"] = float(updated_data["currentAmount"])
-        updated_data["updatedAt"] = datetime.utcnow().isoformat() + "Z"
+        if "deadline" in updated_data:
+            updated_data["deadline"], updated_data["dateFormats.deadline"] = \
+                storage.parse_client_date(updated_data["deadline"])
+        updated_data["updatedAt"] = datetime.utcnow()
 
-        result = goals_collection.update_one(
+        previous = goals_collection.find_one_and_update(
             {"_id": ObjectId(goal_id)},
-            {"$set": updated_data}
+            {"$set": updated_data},
+            projection={"userId": 1}
         )
 
-        if result.matched_count == 0:
+        if not previous:
             return jsonify({"message": "Goal not found"}), 404
 
+        user_id = updated_data.get("userId", previous.get("userId"))
+        changes.bump(counters_collection, "goals", previous.get("userId"), user_id)
+        sync.stamp_updated(goals_collection, counters_collection, tombstones_collection,
+                           previous["_id"], previous.get("userId"), user_id)
+
         return jsonify({"message": "Goal updated successfully"}), 200
 
     except InvalidId:
         return jsonify({"message": f"'{goal_id}' is not a valid ObjectId"}), 400
     except ValueError as e:
-        return jsonify({"message": f"Invalid numeric value: {str(e)}"}), 400
+        return jsonify({"message": f"Invalid value: {str(e)}"}), 400
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-@app.route('/goals/<goal_id>', methods=['DELETE'])
+@api.route('/goals/<goal_id>', methods=['DELETE'])
 def delete_goal(goal_id):
     try:
-        result = goals_collection.delete_one({"_id": ObjectId(goal_id)})
-        if result.deleted_count == 0:
+        deleted = goals_collection.find_one_and_delete({"_id": ObjectId(goal_id)}, projection={"userId": 1})
+        if not deleted:
             return jsonify({"message": "Goal not found"}), 404
 
+        changes.bump(counters_collection, "goals", deleted.get("userId"))
+        sync.record_deleted(tombstones_collection, counters_collection, "goals",
+                            [(deleted["_id"], deleted.get("userId"))])
+
         return jsonify({"message": "Goal deleted successfully"}), 200
 
     except InvalidId:
@@ -486,60 +1063,379 @@ def delete_goal(goal_id):
         return jsonify({"message": str(e)}), 500
 
 # ==================== PREDICTIVE ANALYSIS ====================
-@app.route('/predictive-analysis', methods=['GET'])
+ANALYSIS_WINDOW_DAYS = 90  # Default look-back window, overridable with ?days=
+MAX_ANALYSIS_WINDOW_DAYS = 3660  # Longest ?days= accepted, about ten years
+ANALYSIS_CACHE_SIZE = 10000  # Cached analyses kept before the least recently used is evicted
+ANALYSIS_CACHE_TTL = 300  # Only bounds memory held for idle users; keys change with the data
+
+analysis_cache = cache.LRUCache(ANALYSIS_CACHE_SIZE, ttl=ANALYSIS_CACHE_TTL)
+
+@api.route('/predictive-analysis', methods=['GET'])
 def get_predictive_analysis():
     try:
         user_id = request.args.get('user_id')
         if not user_id:
             return jsonify({"message": "user_id is required"}), 400
 
-        # Fetch transactions for the user
-        transactions = list(transactions_collection.find({"userId": user_id}))
-        if not transactions:
-            return jsonify({"message": "No transactions found for analysis"}), 404
-
-        # Calculate spending per category over the last 3 months (example period)
-        three_months_ago = datetime.utcnow() - timedelta(days=90)
-        category_spending = {}
-        for t in transactions:
-            t_date = datetime.fromisoformat(t["date"].replace("Z", "+00:00"))
-            if t_date >= three_months_ago:
-                category = t["category"]
-                amount = float(t["amount"])
-                if category not in category_spending:
-                    category_spending[category] = []
-                category_spending[category].append(amount)
-
-        # Generate predictions and suggestions
-        predictions = {}
-        suggestions = {}
-        for category, amounts in category_spending.items():
-            avg_monthly = statistics.mean(amounts) if amounts else 0
-            predictions[category] = {
-                "next_week": avg_monthly / 4,  # Weekly estimate
-                "next_month": avg_monthly,     # Monthly average
-                "next_year": avg_monthly * 12  # Yearly projection
-            }
-
-            # Simple savings suggestions based on spending
-            if category.lower() == "food" and avg_monthly > 5000:
-                suggestions[category] = f"Try meal prepping or reducing dining out to save Rs.{(avg_monthly * 0.2):.2f} monthly."
-            elif category.lower() == "entertainment" and avg_monthly > 2000:
-                suggestions[category] = f"Cut back on subscriptions or outings to save Rs.{(avg_monthly * 0.3):.2f} monthly."
-            elif category.lower() == "transport" and avg_monthly > 3000:
-                suggestions[category] = f"Consider carpooling or public transport to save Rs.{(avg_monthly * 0.25):.2f} monthly."
-            elif avg_monthly > 1000:
-                suggestions[category] = f"Review expenses to identify savings of Rs.{(avg_monthly * 0.1):.2f} monthly."
-
-        response = {
-            "predictions": predictions,
-            "suggestions": suggestions
+        days = request.args.get('days', ANALYSIS_WINDOW_DAYS, type=int)
+        if days is None or days <= 0 or days > MAX_ANALYSIS_WINDOW_DAYS:
+            return jsonify({"message": f"days must be an integer between 1 and {MAX_ANALYSIS_WINDOW_DAYS}"}), 400
+        currency = fx.current().require(request.args.get('currency', fx.BASE_CURRENCY).upper())
+
+        # Answer revalidations and repeat visits from the cache while the user's data is unchanged
+        today = datetime.utcnow().date()
+        etag, cache_key = analysis_key(user_id, days, currency, today)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            analysis = cached_analysis(user_id, days, currency, today, cache_key)
+            if analysis is None:
+                return jsonify({"message": "No transactions found for analysis"}), 404
+            response = jsonify(analysis)
+
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+
+    except fx.UnknownCurrency as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"message": str(e)}), 500
+
+def analysis_key(user_id, days, currency, today):
+    # Returns (etag, cache key). Both come from the user's transaction and prediction change
+    # counters, which every worker and the batch forecast job (forecast.py) bump in MongoDB,
+    # the day the window ends on and the version of the rate table.
+    transactions_seq, _ = changes.current(counters_collection, "transactions", user_id)
+    forecast_seq, _ = changes.current(counters_collection, "predictions", user_id)
+    rates_version = fx.current().version
+    return (f"{transactions_seq}-{forecast_seq}-{today.isoformat()}-{days}-{currency}-{rates_version}",
+            (user_id, days, currency, today, transactions_seq, forecast_seq, rates_version))
+
+def cached_analysis(user_id, days, currency, today, cache_key):
+    analysis = analysis_cache.get(cache_key)
+    if analysis is None:
+        analysis = compute_predictive_analysis(user_id, days, currency, today)
+        if analysis is not None:
+            analysis_cache.set(cache_key, analysis)
+    return analysis
+
+def compute_predictive_analysis(user_id, days, currency, today):
+    # Sum and count spending per category, currency and day over the window on the server,
+    # then convert the daily totals at each day's rates in one call and add them up per category.
+    # The window starts at midnight (UTC), days before today, so it only moves once a day.
+    since = datetime(today.year, today.month, today.day) - timedelta(days=days)
+    pipeline = [
+        {"$match": {"userId": user_id, "date": {"$gte": since}}},
+        {"$group": {
+            "_id": {
+                "category": "$category",
+                "currency": {"$ifNull": ["$currency", fx.BASE_CURRENCY]},
+                "day": {"$dateTrunc": {"date": "$date", "unit": "day"}}
+            },
+            "total": {"$sum": "$amount"},
+            "count": {"$sum": 1}
+        }}
+    ]
+    rows = list(transactions_collection.aggregate(pipeline))
+    if not rows and not transactions_collection.find_one({"userId": user_id}, {"_id": 1}):
+        return None
+
+    rates = fx.current()
+    converted = rates.convert(
+        [storage.to_float(row["total"]) for row in rows],
+        [row["_id"]["currency"] for row in rows],
+        [row["_id"]["day"].toordinal() for row in rows],
+        currency
+    )
+    category_spending = {}
+    unconverted = set()
+    for row, total in zip(rows, converted.tolist()):
+        if math.isnan(total):
+            unconverted.add(row["_id"]["currency"])
+            continue
+        spending = category_spending.setdefault(row["_id"]["category"], {"total": 0.0, "count": 0})
+        spending["total"] += total
+        spending["count"] += row["count"]
+
+    # Precomputed trend/seasonal forecasts replace the window average where the batch job has one.
+    # There is one per currency spent in, each converted at today's rates and added up per category.
+    forecasts = list(predictions_collection.find(
+        {"userId": user_id, "source": "forecast"}, {"category": 1, "forecast": 1, "month": 1, "currency": 1}
+    ))
+    horizons = ("next_week", "next_month", "next_year")
+    forecast_values = rates.convert(
+        [row["forecast"][horizon] for row in forecasts for horizon in horizons],
+        [row.get("currency") or fx.BASE_CURRENCY for row in forecasts for _ in horizons],
+        [today.toordinal()] * (len(forecasts) * len(horizons)),
+        currency
+    ).tolist()
+
+    # Generate predictions and suggestions. Suggestion thresholds are in rupees. predictions
+    # only holds the numbers per horizon; how each category's were made is under models.
+    predictions = {}
+    models = {}
+    suggestions = {}
+    spending = {}
+    symbol = "Rs." if currency == fx.BASE_CURRENCY else f"{currency} "
+    in_rupees = rates.convert([1.0], [currency], [today.toordinal()], fx.BASE_CURRENCY)[0]
+    for category, row in category_spending.items():
+        avg_monthly = row["total"] / row["count"] if row["count"] else 0
+        spending[category] = {
+            "total": row["total"],
+            "count": row["count"],
+            "mean": avg_monthly
+        }
+        predictions[category] = {
+            "next_week": avg_monthly / 4,  # Weekly estimate
+            "next_month": avg_monthly,     # Monthly average
+            "next_year": avg_monthly * 12,  # Yearly projection
+        }
+        models[category] = {"model": "window-average"}
+
+        # Simple savings suggestions based on spending
+        avg_rupees = avg_monthly * in_rupees
+        if category.lower() == "food" and avg_rupees > 5000:
+            suggestions[category] = f"Try meal prepping or reducing dining out to save {symbol}{(avg_monthly * 0.2):.2f} monthly."
+        elif category.lower() == "entertainment" and avg_rupees > 2000:
+            suggestions[category] = f"Cut back on subscriptions or outings to save {symbol}{(avg_monthly * 0.3):.2f} monthly."
+        elif category.lower() == "transport" and avg_rupees > 3000:
+            suggestions[category] = f"Consider carpooling or public transport to save {symbol}{(avg_monthly * 0.25):.2f} monthly."
+        elif avg_rupees > 1000:
+            suggestions[category] = f"Review expenses to identify savings of {symbol}{(avg_monthly * 0.1):.2f} monthly."
+
+    forecast_predictions = {}
+    for position, row in enumerate(forecasts):
+        values = forecast_values[position * len(horizons):(position + 1) * len(horizons)]
+        if any(math.isnan(value) for value in values):
+            unconverted.add(row.get("currency"))
+            continue
+        prediction = forecast_predictions.setdefault(row["category"], dict.fromkeys(horizons, 0.0))
+        for horizon, value in zip(horizons, values):
+            prediction[horizon] += value
+        models[row["category"]] = {"model": "forecast", "month": row["month"]}
+    predictions.update(forecast_predictions)
+
+    analysis = {
+        "predictions": predictions,
+        "models": models,
+        "suggestions": suggestions,
+        "spending": spending,
+        "currency": currency,
+        "window_days": days
+    }
+    if unconverted:
+        # Amounts in currencies with no rates are left out
+        analysis["unconverted_currencies"] = sorted(unconverted)
+    return analysis
+
+# ==================== ANALYTICS ====================
+# Spending time series for charts: ?granularity=day|week|month (default month) and
+# ?group_by=category|type (default category) over the buckets overlapping ?from= to ?to=,
+# by default the last few buckets up to this one, in ?currency= (default LKR). Closed buckets
+# come from the bucket cache (see analytics.py), so only the open bucket and ones touched by
+# writes are queried.
+@api.route('/analytics/spending', methods=['GET'])
+def get_spending_analytics():
+    try:
+        user_id = request.args.get('user_id')
+        if not user_id:
+            return jsonify({"message": "user_id is required"}), 400
+
+        granularity = request.args.get('granularity', 'month')
+        if granularity not in analytics.GRANULARITIES:
+            return jsonify({"message": f"granularity must be one of {', '.join(analytics.GRANULARITIES)}"}), 400
+        group_by = request.args.get('group_by', 'category')
+        if group_by not in analytics.GROUPINGS:
+            return jsonify({"message": f"group_by must be one of {', '.join(analytics.GROUPINGS)}"}), 400
+        rates = fx.current()
+        currency = rates.require(request.args.get('currency', fx.BASE_CURRENCY).upper())
+
+        now = datetime.utcnow()
+        current = analytics.bucket_start(now, granularity)
+        if request.args.get('to'):
+            end = storage.parse_datetime(request.args['to'])
+        else:
+            end = analytics.shift(current, granularity, 1)
+        if request.args.get('from'):
+            start = storage.parse_datetime(request.args['from'])
+        else:
+            start = analytics.shift(analytics.bucket_start(end - timedelta(microseconds=1), granularity),
+                                    granularity, 1 - analytics.DEFAULT_BUCKETS[granularity])
+
+        starts = analytics.bucket_starts(start, end, granularity)
+        if not starts:
+            return jsonify({"message": "from must be before to"}), 400
+        if len(starts) > analytics.MAX_BUCKETS:
+            return jsonify({"message": f"At most {analytics.MAX_BUCKETS} buckets per request"}), 400
+
+        # The resolved window is part of the ETag: without ?to= it moves when a new bucket opens
+        seq, _ = changes.current(counters_collection, "transactions", user_id)
+        etag = f"{seq}-{zlib.crc32(request.query_string):x}-{starts[0]:%Y%m%d}-{starts[-1]:%Y%m%d}-{rates.version}"
+        cached = not_modified(etag, None)
+        if cached:
+            return cached
+
+        series = analytics.series(analytics_collection, transactions_collection, user_id, granularity, starts, now)
+        buckets, unconverted = analytics.to_currency(rates, series, granularity, group_by, currency)
+        result = {
+            "user_id": user_id,
+            "granularity": granularity,
+            "group_by": group_by,
+            "currency": currency,
+            "from": starts[0],
+            "to": analytics.shift(starts[-1], granularity, 1),
+            "buckets": [{"start": bucket, "groups": buckets[bucket]} for bucket in starts]
+        }
+        if unconverted:
+            # Amounts in currencies with no rates are left out of the totals
+            result["unconverted_currencies"] = unconverted
+        response = jsonify(result)
+        return set_validators(response, etag, None), 200
+
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"message": str(e)}), 500
+
+# ==================== SYNC ====================
+# Changes to a user's transactions, budgets, goals and predictions after ?since=, oldest
+# first (see sync.py). Clients keep next_since and ask again straight away while has_more.
+# A cursor older than the tombstones still kept gets 410 with "resync": true; the client
+# then drops its local copy and syncs again from since=0.
+@api.route('/sync', methods=['GET'])
+def get_sync():
+    try:
+        user_id = request.args.get('user_id')
+        if not user_id:
+            return jsonify({"message": "user_id is required"}), 400
+
+        since = request.args.get('since', 0, type=int)
+        if since is None or since < 0:
+            return jsonify({"message": "since must be a non-negative integer"}), 400
+        limit = request.args.get('limit', sync.SYNC_PAGE_SIZE, type=int)
+        if limit is None or not 0 < limit <= sync.MAX_SYNC_PAGE_SIZE:
+            return jsonify({"message": f"limit must be between 1 and {sync.MAX_SYNC_PAGE_SIZE}"}), 400
+
+        sources = {
+            "transactions": transactions_collection,
+            "budgets": budgets_collection,
+            "goals": goals_collection,
+            "predictions": predictions_collection,
+            "deleted": tombstones_collection
         }
-        return jsonify(response), 200
+        pages, _ = fanout.run({
+            **{
+                name: (lambda collection=collection: sync.changed_since(collection, user_id, since, limit))
+                for name, collection in sources.items()
+            },
+            "expired": lambda: sync.expired_through(counters_collection, user_id)
+        })
+        expired_through = pages.pop("expired")
+        if 0 < since < expired_through:
+            return jsonify({
+                "message": "Changes since this cursor are no longer kept; sync again from since=0",
+                "resync": True
+            }), 410
+        deleted = pages.pop("deleted")
+        entries, next_since, has_more = sync.merge(pages, deleted, since, limit)
+
+        return jsonify({"since": since, "next_since": next_since, "has_more": has_more, "changes": entries}), 200
 
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
+# ==================== DASHBOARD ====================
+SUMMARY_RECENT_TRANSACTIONS = 10
+
+# Everything the home screen shows in one response. The sections are independent queries,
+# so they run concurrently on the fan-out pool; in debug mode the response also reports
+# how long each one took. With ?currency= every amount except recent transactions is in it.
+@api.route('/users/<user_id>/summary', methods=['GET'])
+def get_user_summary(user_id):
+    try:
+        object_id = ObjectId(user_id)
+        today = datetime.utcnow().date()
+        period = today.strftime("%Y-%m")
+        currency = request.args.get('currency')
+        if currency:
+            currency = fx.current().require(currency.upper())
+        sections, timings = fanout.run({
+            "user": lambda: users_collection.find_one({"_id": object_id}, {"name": 1, "email": 1}),
+            "goals": lambda: list(goals_collection.find(
+                {"userId": user_id},
+                {"title": 1, "targetAmount": 1, "currentAmount": 1, "currency": 1, "deadline": 1, "priority": 1,
+                 "dateFormats": 1}
+            ).sort("deadline", 1)),
+            "budgets": lambda: list(budgets_collection.aggregate(budget_status_pipeline(user_id, period))),
+            "recent_transactions": lambda: list(transactions_collection.find(
+                {"userId": user_id},
+                {"date": 1, "category": 1, "amount": 1, "currency": 1, "note": 1, "type": 1, "dateFormats": 1}
+            ).sort([("date", -1), ("_id", -1)]).limit(SUMMARY_RECENT_TRANSACTIONS)),
+            "analysis": lambda: cached_analysis(
+                user_id, ANALYSIS_WINDOW_DAYS, currency or fx.BASE_CURRENCY, today,
+                analysis_key(user_id, ANALYSIS_WINDOW_DAYS, currency or fx.BASE_CURRENCY, today)[1]
+            )
+        })
+        if not sections["user"]:
+            return jsonify({"message": "User not found"}), 404
+        for document in sections["goals"] + sections["recent_transactions"]:
+            storage.to_wire(document)
+
+        analysis = sections["analysis"] or {"predictions": {}, "suggestions": {}}
+        summary = {
+            "user": sections["user"],
+            "goals": goals_in_currency(sections["goals"], currency) if currency else sections["goals"],
+            "budgets": {"period": period, "budgets": budget_statuses(sections["budgets"], period, currency)},
+            "recent_transactions": sections["recent_transactions"],
+            "predictions": {
+                category: prediction["next_month"] for category, prediction in analysis["predictions"].items()
+            },
+            "suggestions": analysis["suggestions"]
+        }
+        if current_app.debug:
+            summary["timings_ms"] = timings
+        return jsonify(summary), 200
+
+    except InvalidId:
+        return jsonify({"message": f"'{user_id}' is not a valid ObjectId"}), 400
+    except fx.UnknownCurrency as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"message": str(e)}), 500
+
+# Helper function to convert goal amounts at today's rates, all goals in one call.
+# Goals in a currency with no rates keep their own amounts and currency.
+def goals_in_currency(goals, currency):
+    fields = ("targetAmount", "currentAmount")
+    amounts = [storage.to_float(goal.get(field)) or 0.0 for goal in goals for field in fields]
+    converted = fx.current().convert(
+        amounts,
+        [goal.get("currency") or fx.BASE_CURRENCY for goal in goals for _ in fields],
+        [datetime.utcnow().toordinal()] * len(amounts),
+        currency
+    ).tolist()
+    for position, goal in enumerate(goals):
+        values = converted[position * len(fields):(position + 1) * len(fields)]
+        if not any(math.isnan(value) for value in values):
+            goal.update(zip(fields, values), currency=currency)
+    return goals
+
+# ==================== DIAGNOSTICS ====================
+@api.route('/pool-stats', methods=['GET'])
+def get_pool_stats():
+    try:
+        mongo = current_app.extensions["mongo"]
+        stats = mongo.pool_stats.snapshot()
+        stats["max_pool_size"] = mongo.config["MONGO_MAX_POOL_SIZE"]
+        stats["wait_queue_timeout_ms"] = mongo.config["MONGO_WAIT_QUEUE_TIMEOUT_MS"]
+        return jsonify(stats), 200
+    except Exception as e:
+        return jsonify({"message": str(e)}), 500
+
 # ==================== RUN THE APP ====================
 if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        indexes.ensure_indexes(app.extensions["mongo"].db)
     app.run(debug=True, host="0.0.0.0")
\ No newline at end of file
@@ -0,0 +1,125 @@
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from app import create_app
+
+# ASGI entry point for high-concurrency deployments, e.g.
+#
+#     uvicorn asgi:application --host 0.0.0.0 --port 5000
+#
+# Connections, request bodies and response streaming are handled on the event loop, so
+# thousands of idle or slow clients cost no threads. Each request then runs the regular
+# Flask app, with the same routes, validation and document shaping, on a dedicated
+# executor where its blocking pymongo calls can wait without stalling the loop.
+
+ASGI_WORKER_THREADS = 256  # Handlers in flight at once; further requests queue on the loop
+
+
+class ExecutorWSGIAdapter:
+    def __init__(self, wsgi_app, max_workers=ASGI_WORKER_THREADS):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="asgi-handler")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.handle(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def handle(self, scope, receive, send):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        loop = asyncio.get_running_loop()
+        environ = self.environ(scope, bytes(body))
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+
+        def run():
+            # Calls the app and produces its first chunk, which is when lazy apps call start_response.
+            # A response with a Content-Length is already built in memory (every route but the
+            # exports), so it is drained and closed here too, without more executor hops.
+            iterable = self.wsgi_app(environ, start_response)
+            iterator = iter(iterable)
+            chunk = next(iterator, None)
+            if not any(name == b"content-length" for name, _ in started["headers"]):
+                return iterable, iterator, chunk, None
+            try:
+                return None, None, None, ([chunk] if chunk is not None else []) + list(iterator)
+            finally:
+                if hasattr(iterable, "close"):
+                    iterable.close()
+
+        iterable, iterator, chunk, buffered = await loop.run_in_executor(self.executor, run)
+        if buffered is not None:
+            await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+            await send({"type": "http.response.body", "body": b"".join(buffered), "more_body": False})
+            return
+        try:
+            await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+            # Streaming response, e.g. /transactions/export: pull each chunk off the loop
+            while chunk is not None:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            if hasattr(iterable, "close"):
+                await loop.run_in_executor(self.executor, iterable.close)
+
+    @staticmethod
+    def environ(scope, body):
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": client[0],
+            "REMOTE_PORT": str(client[1]),
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False
+        }
+        for name, value in scope.get("headers", []):
+            name = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if name == "CONTENT_TYPE":
+                environ["CONTENT_TYPE"] = value
+            elif name != "CONTENT_LENGTH":
+                key = f"HTTP_{name}"
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+
+application = ExecutorWSGIAdapter(create_app())
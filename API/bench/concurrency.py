@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+# Side-by-side throughput and latency of the threaded WSGI server and the ASGI flavour at
+# high connection counts. Start both against the same database, e.g.
+#
+#     gunicorn -w 1 --threads 32 -b :5000 'app:create_app()'
+#     uvicorn asgi:application --port 5001
+#
+# then run
+#
+#     python bench/concurrency.py --target wsgi=http://localhost:5000 --target asgi=http://localhost:5001
+#
+# Every connection is a keep-alive HTTP/1.1 client issuing GETs back to back for --duration seconds.
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status, headers.get("connection") == "close"
+
+
+async def client(url, deadline, latencies, errors):
+    parts = urlsplit(url)
+    target = parts.path + (f"?{parts.query}" if parts.query else "")
+    request = f"GET {target or '/'} HTTP/1.1\r\nHost: {parts.netloc}\r\nConnection: keep-alive\r\n\r\n".encode()
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status, closed = await read_response(reader)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if status >= 500:
+                errors.append(status)
+            if closed:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            errors.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_target(name, url, connections, duration):
+    latencies, errors = [], []
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(client(url, deadline, latencies, errors) for _ in range(connections)))
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(latencies) or [0]
+    return {
+        "target": name,
+        "url": url,
+        "connections": connections,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(ordered), 2),
+        "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 2)
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare servers at high concurrency")
+    parser.add_argument("--target", action="append", required=True, help="name=base_url, repeatable")
+    parser.add_argument("--path", default="/goals?user_id=bench")
+    parser.add_argument("--connections", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    for target in args.target:
+        name, base_url = target.split("=", 1)
+        results.append(asyncio.run(run_target(name, base_url + args.path, args.connections, args.duration)))
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,92 @@
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# Measures read-endpoint latency on a running API, first on its own and then while
+# --login-threads clients log in continuously. With hashing offloaded to the password
+# pool the two distributions should be close; inline hashing shows up as a fat p99.
+#
+# Admission control allows a handful of logins per email and address, so start the server
+# with FLASK_ADMISSION_ENABLED=false; otherwise most logins are throttled before they hash
+# anything. The report counts logins that were hashed, throttled (429) and refused by the
+# full hashing pool (503) separately.
+
+
+def request(url, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def measure_reads(url, duration):
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        request(url)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def summarize(label, latencies):
+    return {
+        "phase": label,
+        "requests": len(latencies),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2)
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Read latency with and without concurrent login load")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--email", default="bench@example.com")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--read-path", default="/goals?user_id=bench")
+    parser.add_argument("--login-threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    request(args.url + "/register", {"email": args.email, "password": args.password})
+    read_url = args.url + args.read_path
+
+    results = [summarize("idle", measure_reads(read_url, args.duration))]
+
+    stop = threading.Event()
+    logins = []
+
+    def log_in():
+        while not stop.is_set():
+            logins.append(request(args.url + "/login", {"email": args.email, "password": args.password}))
+
+    threads = [threading.Thread(target=log_in, daemon=True) for _ in range(args.login_threads)]
+    for thread in threads:
+        thread.start()
+    results.append(summarize(f"{args.login_threads} concurrent logins", measure_reads(read_url, args.duration)))
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    results[-1]["logins"] = len(logins)
+    results[-1]["logins_hashed"] = sum(1 for status in logins if status in (200, 401))
+    results[-1]["logins_throttled"] = sum(1 for status in logins if status == 429)
+    results[-1]["logins_rejected"] = sum(1 for status in logins if status == 503)
+    print(json.dumps(results, indent=2))
+    if results[-1]["logins_throttled"] > results[-1]["logins_hashed"]:
+        print("Most logins were throttled; restart the server with FLASK_ADMISSION_ENABLED=false", file=sys.stderr)
@@ -0,0 +1,226 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(os.path.dirname(API_DIR), "data")
+sys.path[:0] = [API_DIR, DATA_DIR]
+
+import categories
+import generate_dataset
+import indexes
+import mongo_import
+import storage
+from app import create_app
+
+# Drives every route of the API in-process with a synthetic dataset and reports
+# throughput and p50/p95/p99 latency per endpoint as JSON, so runs can be compared
+# across commits:
+#
+#     python bench/routes.py --output bench-$(git rev-parse --short HEAD).json
+#     python bench/routes.py --in-memory        # mongomock instead of a local mongod
+#
+# mongomock can't sum or compare Decimal128 amounts, so with --in-memory the routes that
+# aggregate amounts answer 500; use a real mongod when comparing those.
+# The benchmark database (--db) is dropped and reloaded on every run.
+
+
+BATCH_SIZES = {  # Transactions per request of the bulk scenarios, also reported per second
+    "POST /transactions/bulk": 100,
+    "POST /transactions/bulk (10k)": 10000,
+}
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=API_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_dataset(db, directory):
+    for filename in sorted(os.listdir(directory)):
+        # Generated documents refer to users by hex string, as the API does, so only _id is coerced
+        stats = mongo_import.load_file(db, os.path.join(directory, filename), 1000, coerce_fields=["_id"])
+        print(stats.report(), file=sys.stderr)
+    # The generator writes ISO strings and plain numbers; store them as the API does
+    for name in storage.TYPED_FIELDS:
+        storage.backfill(db, name, max_rate=0, log=lambda message: None)
+    # Loading bypasses the write handlers that keep category usage counts
+    categories.rebuild(db[categories.USAGE], db["transactions"])
+
+
+class Scenarios:
+    # Each scenario returns (method, path, json_body); ids created by POSTs feed the later GET/PUT/DELETEs
+    def __init__(self, user_ids, seed):
+        self.rng = random.Random(seed)
+        self.user_ids = user_ids
+        self.created = {"transactions": [], "budgets": [], "predictions": [], "goals": []}
+        self.counter = itertools.count()
+
+    def user(self):
+        return self.rng.choice(self.user_ids)
+
+    def transaction(self):
+        return {
+            "date": datetime.utcnow().isoformat(),
+            "userId": self.user(),
+            "category": self.rng.choice(["Food", "Transport", "Groceries", "Other"]),
+            "amount": round(self.rng.uniform(50, 5000), 2),
+            "note": "bench"
+        }
+
+    def payloads(self):
+        return {
+            "transactions": self.transaction,
+            "budgets": lambda: {"userId": self.user(), "category": "Food", "limit": 25000},
+            "predictions": lambda: {"userId": self.user(), "category": "Food", "predicted_amount": 18000},
+            "goals": lambda: {
+                "userId": self.user(), "title": "Bench goal", "targetAmount": 100000,
+                "currentAmount": 1000, "deadline": "2030-01-01"
+            }
+        }
+
+    def crud(self, collection, update):
+        create = self.payloads()[collection]
+        ids = self.created[collection]
+        return [
+            (f"GET /{collection}", lambda: ("GET", f"/{collection}?user_id={self.user()}&limit=100", None)),
+            (f"POST /{collection}", lambda: ("POST", f"/{collection}", create())),
+            (f"GET /{collection}/<id>", lambda: ("GET", f"/{collection}/{self.rng.choice(ids)}", None)),
+            (f"PUT /{collection}/<id>", lambda: ("PUT", f"/{collection}/{self.rng.choice(ids)}", update)),
+            (f"DELETE /{collection}/<id>", lambda: ("DELETE", f"/{collection}/{ids.pop()}", None)),
+        ]
+
+    def all(self, user_count):
+        return [
+            ("POST /register", lambda: ("POST", "/register", {
+                "email": f"bench{next(self.counter)}@example.com", "password": generate_dataset.PASSWORD
+            })),
+            ("POST /login", lambda: ("POST", "/login", {
+                "email": f"user{self.rng.randrange(user_count)}@example.com", "password": generate_dataset.PASSWORD
+            })),
+            ("GET /users/<id>", lambda: ("GET", f"/users/{self.user()}", None)),
+            ("GET /users", lambda: ("GET", "/users?limit=100", None)),
+            ("GET /users/<id>/summary", lambda: ("GET", f"/users/{self.user()}/summary", None)),
+            *self.crud("transactions", {"amount": 123.45}),
+            *[(name, lambda size=size: ("POST", "/transactions/bulk", [self.transaction() for _ in range(size)]))
+              for name, size in BATCH_SIZES.items()],
+            ("GET /transactions/search", lambda: (
+                "GET", f"/transactions/search?user_id={self.user()}&q={self.rng.choice(['lunch', 'taxi', 'food'])}", None)),
+            ("GET /categories/suggest", lambda: (
+                "GET", f"/categories/suggest?user_id={self.user()}&prefix={self.rng.choice(['f', 'gr', 'tr'])}", None)),
+            ("GET /transactions/export", lambda: ("GET", f"/transactions/export?user_id={self.user()}", None)),
+            *self.crud("budgets", {"limit": 30000}),
+            ("GET /budgets/status", lambda: ("GET", f"/budgets/status?user_id={self.user()}", None)),
+            *self.crud("predictions", {"predicted_amount": 20000}),
+            *self.crud("goals", {"currentAmount": 2000}),
+            ("GET /predictive-analysis", lambda: ("GET", f"/predictive-analysis?user_id={self.user()}", None)),
+            ("GET /sync", lambda: ("GET", f"/sync?user_id={self.user()}&since=0&limit=500", None)),
+            ("GET /analytics/spending", lambda: (
+                "GET", f"/analytics/spending?user_id={self.user()}&granularity=week&from=2020-01-01", None)),
+            ("GET /pool-stats", lambda: ("GET", "/pool-stats", None)),
+            ("GET /metrics", lambda: ("GET", "/metrics", None)),
+        ]
+
+
+def run(client, scenarios, user_count, requests, auth_requests, bulk_requests):
+    results = []
+    for name, make_request in scenarios.all(user_count):
+        if name in ("POST /register", "POST /login"):
+            count = auth_requests
+        elif name == "POST /transactions/bulk (10k)":
+            count = bulk_requests
+        else:
+            count = requests
+        latencies, statuses = [], {}
+        elapsed = 0
+        for _ in range(count):
+            # Building the body isn't part of the request being measured
+            method, path, body = make_request()
+            request_started = time.perf_counter()
+            response = client.open(path, method=method, json=body)
+            response.get_data()
+            latencies.append((time.perf_counter() - request_started) * 1000)
+            elapsed += latencies[-1] / 1000
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            collection = name.split("/")[1]
+            if name == f"POST /{collection}" and collection in scenarios.created and response.status_code == 201:
+                scenarios.created[collection].append(next(v for k, v in response.json.items() if k.endswith("_id")))
+
+        ordered = sorted(latencies)
+        results.append({
+            "endpoint": name,
+            "requests": count,
+            "statuses": {str(code): n for code, n in sorted(statuses.items())},
+            "requests_per_sec": round(count / elapsed, 1),
+            "p50_ms": round(statistics.median(ordered), 3),
+            "p95_ms": round(percentile(ordered, 95), 3),
+            "p99_ms": round(percentile(ordered, 99), 3)
+        })
+        if name in BATCH_SIZES:
+            results[-1]["transactions_per_sec"] = round(count * BATCH_SIZES[name] / elapsed, 1)
+        print(f"{name:32} {results[-1]['requests_per_sec']:>9} req/s  p50 {results[-1]['p50_ms']:>8} ms  "
+              f"p99 {results[-1]['p99_ms']:>8} ms"
+              + (f"  {results[-1]['transactions_per_sec']:>9} transactions/s" if name in BATCH_SIZES else ""),
+              file=sys.stderr)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Per-endpoint throughput and latency benchmark")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--db", default="finace_app_bench")
+    parser.add_argument("--in-memory", action="store_true", help="Use mongomock instead of a MongoDB server")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--transactions", type=int, default=500, help="Transactions per user")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--auth-requests", type=int, default=20, help="Requests for register/login")
+    parser.add_argument("--bulk-requests", type=int, default=5, help="Requests for the 10k-transaction bulk insert")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.db == "finace_app":
+        parser.error("refusing to drop the application database; pick another --db")
+
+    # Every scenario reuses the same few users far faster than the rate limits allow
+    config = {"MONGO_URI": args.uri, "MONGO_DB": args.db, "ADMISSION_ENABLED": False}
+    if args.in_memory:
+        import mongomock
+        config["MONGO_CLIENT_FACTORY"] = mongomock.MongoClient
+    app = create_app(config)
+
+    with app.app_context():
+        mongo = app.extensions["mongo"]
+        mongo.client.drop_database(args.db)
+        with tempfile.TemporaryDirectory() as directory:
+            user_ids = generate_dataset.generate(directory, args.users, args.transactions, seed=args.seed)
+            load_dataset(mongo.db, directory)
+        indexes.ensure_indexes(mongo.db)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "backend": "mongomock" if args.in_memory else args.uri,
+        "dataset": {"users": args.users, "transactions_per_user": args.transactions, "seed": args.seed},
+        "endpoints": run(app.test_client(), Scenarios(user_ids, args.seed), args.users,
+                         args.requests, args.auth_requests, args.bulk_requests)
+    }
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
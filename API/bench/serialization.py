@@ -0,0 +1,84 @@
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serialize
+
+# Serialization cost of a page of transactions as they come from the driver, before and
+# after the serialize module:
+#
+#     python bench/serialization.py --documents 10000
+#
+# "before" is the old path: format_document() on every document, then Flask's default
+# provider (stdlib json, sorted keys). "after" is serialize.dumps, with orjson when it is
+# installed and with the stdlib encoder either way.
+
+
+def make_documents(count):
+    now = datetime(2024, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "date": (now - timedelta(minutes=i)).isoformat(),
+            "userId": "65f0c0ffee0000000000beef",
+            "category": ["Food", "Transport", "Groceries", "Other"][i % 4],
+            "amount": round(100 + i * 0.37, 2),
+            "currency": "LKR",
+            "note": "Lunch with the team",
+            "type": "Expense",
+            "createdAt": now - timedelta(minutes=i),
+            "updatedAt": now - timedelta(minutes=i)
+        }
+        for i in range(count)
+    ]
+
+
+def format_document(document):
+    # The per-document formatting every route used to apply
+    document["_id"] = str(document["_id"])
+    if "date" in document:
+        document["date"] = document["date"]
+    if "deadline" in document:
+        document["deadline"] = document["deadline"]
+    return document
+
+
+def measure(function, documents, repeat):
+    # Each run gets fresh documents, since the old path mutates them
+    runs = [[dict(document) for document in documents] for _ in range(repeat)]
+    timings = [timeit.timeit(lambda: function(runs.pop()), number=1) for _ in range(repeat)]
+    return round(min(timings) * 1000, 2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="JSON serialization cost per batch of documents")
+    parser.add_argument("--documents", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5, help="Best of this many runs")
+    args = parser.parse_args()
+
+    documents = make_documents(args.documents)
+    provider = DefaultJSONProvider(Flask(__name__))
+    fast_backend = serialize.orjson
+
+    def before(batch):
+        return provider.dumps([format_document(document) for document in batch]).encode()
+
+    def after(batch):
+        return serialize.dumps(batch)
+
+    results = {"documents": args.documents, "before_ms": measure(before, documents, args.repeat)}
+    serialize.orjson = None
+    results["after_stdlib_ms"] = measure(after, documents, args.repeat)
+    serialize.orjson = fast_backend
+    if fast_backend is not None:
+        results["after_orjson_ms"] = measure(after, documents, args.repeat)
+
+    print(json.dumps(results, indent=2))
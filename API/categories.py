@@ -0,0 +1,122 @@
+import argparse
+from datetime import datetime
+from pymongo import DeleteOne, MongoClient, UpdateOne
+
+# Per-user category usage, one document per (userId, key) counting the user's transactions
+# in a category and when one was last written. The key is the category with case and spacing
+# normalized, so "Food" and "food " are one category, shown as it was most recently written:
+#
+#     {userId, key: "food & drinks", category: "Food & Drinks", count: 42, lastUsed: 2024-05-01T...}
+#
+# GET /categories/suggest completes a prefix from these, most used first, so typing never
+# touches the transactions. The transaction write handlers keep them current with $inc
+# deltas, as they do the rollups; repair drift, or fill them in after a bulk load with
+# mongo_import.py, with `python categories.py rebuild`.
+
+USAGE = "category_usage"
+MAX_CATEGORIES = 1000  # Per user, most used first; suggestions are only drawn from these
+
+
+def normalize(category):
+    # Case- and whitespace-insensitive form that prefixes are matched against
+    return " ".join(str(category).casefold().split())
+
+
+def record(usage, added=(), removed=()):
+    # Called after transactions are written or deleted, with the documents as they were stored
+    deltas = {}  # (userId, key) -> [count delta, latest spelling written]
+    for transactions, step in ((removed, -1), (added, 1)):
+        for transaction in transactions:
+            if transaction.get("userId") is None or transaction.get("category") is None:
+                continue
+            delta = deltas.setdefault((transaction["userId"], normalize(transaction["category"])), [0, None])
+            delta[0] += step
+            if step > 0:
+                delta[1] = transaction["category"]
+
+    now = datetime.utcnow()
+    operations = []
+    emptied = []
+    for (user_id, key), (delta, spelling) in deltas.items():
+        match = {"userId": user_id, "key": key}
+        update = {"$inc": {"count": delta}}
+        if spelling is not None:
+            update.update({"$set": {"category": spelling}, "$max": {"lastUsed": now}})
+        elif delta == 0:
+            continue
+        operations.append(UpdateOne(match, update, upsert=delta > 0))
+        if delta < 0:
+            emptied.append(DeleteOne({**match, "count": {"$lte": 0}}))
+    # Ordered, so a category is only dropped after its count has come down
+    if operations:
+        usage.bulk_write(operations + emptied)
+
+
+def move(usage, old, new):
+    # Called after a PUT with the document before and after the update; a new spelling of
+    # the same category only updates how it is shown
+    if (old.get("userId"), old.get("category")) != (new.get("userId"), new.get("category")):
+        record(usage, added=[new], removed=[old])
+
+
+def load(usage, user_id):
+    return list(usage.find(
+        {"userId": user_id},
+        {"_id": 0, "category": 1, "key": 1, "count": 1}
+    ).sort([("count", -1), ("lastUsed", -1)]).limit(MAX_CATEGORIES))
+
+
+def suggest(entries, prefix, limit):
+    # entries as returned by load(). Categories starting with the prefix come first, then
+    # ones with a later word starting with it ("food" finds "Fast Food"), each most used first.
+    prefix = normalize(prefix)
+    starts, words = [], []
+    for entry in entries:
+        if entry["key"].startswith(prefix):
+            starts.append(entry)
+        elif any(word.startswith(prefix) for word in entry["key"].split()[1:]):
+            words.append(entry)
+    return [{"category": entry["category"], "count": entry["count"]} for entry in (starts + words)[:limit]]
+
+
+def rebuild(usage, transactions, user_id=None):
+    # Recount usage from raw transactions. MongoDB counts each spelling; they are merged
+    # here, showing the one written last.
+    query = {"userId": user_id} if user_id else {}
+    pipeline = [
+        {"$match": query},
+        {"$group": {
+            "_id": {"userId": "$userId", "category": "$category"},
+            "count": {"$sum": 1},
+            "lastUsed": {"$max": {"$ifNull": ["$updatedAt", "$createdAt"]}}
+        }},
+        {"$sort": {"lastUsed": 1}}
+    ]
+    merged = {}
+    for row in transactions.aggregate(pipeline, allowDiskUse=True):
+        owner, category = row["_id"].get("userId"), row["_id"].get("category")
+        if owner is None or category is None:
+            continue
+        key = normalize(category)
+        entry = merged.setdefault((owner, key), {"userId": owner, "key": key, "count": 0})
+        entry.update(category=category, lastUsed=row["lastUsed"], count=entry["count"] + row["count"])
+    rows = list(merged.values())
+
+    usage.delete_many(query)
+    if rows:
+        usage.insert_many(rows)
+    return len(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Maintain per-user category usage counts")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = subcommands.add_parser("rebuild", help="Recount usage from raw transactions")
+    rebuild_parser.add_argument("--user-id", help="Only rebuild this user's counts")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/")
+    args = parser.parse_args()
+
+    db = MongoClient(args.uri)["finace_app"]
+    if args.command == "rebuild":
+        count = rebuild(db[USAGE], db["transactions"], args.user_id)
+        print(f"Rebuilt {count} category usage counts.")
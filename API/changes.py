@@ -0,0 +1,30 @@
+from datetime import datetime
+from pymongo import UpdateOne
+
+# Per-user, per-collection change counters used as cheap HTTP validators.
+# Every write bumps the counter of the user and collection it touched; a counter is a
+# single document keyed by _id, so checking one before a list query is one index lookup.
+
+
+def counter_id(collection_name, user_id):
+    return f"{user_id}:{collection_name}"
+
+
+def bump(counters, collection_name, *user_ids):
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"_id": counter_id(collection_name, user_id)},
+            {"$inc": {"seq": 1}, "$set": {"updatedAt": now}},
+            upsert=True
+        )
+        for user_id in set(user_ids) if user_id is not None
+    ]
+    if operations:
+        counters.bulk_write(operations, ordered=False)
+
+
+def current(counters, collection_name, user_id):
+    # Returns (seq, updatedAt); (0, None) until the first write
+    counter = counters.find_one({"_id": counter_id(collection_name, user_id)}) or {}
+    return counter.get("seq", 0), counter.get("updatedAt")
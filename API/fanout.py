@@ -0,0 +1,49 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+# Runs the independent queries of one request concurrently, so a response that needs several
+# collections costs about one MongoDB round trip instead of one per collection. The pool is
+# shared by all requests and bounded, so a burst of such requests queues for threads rather
+# than multiplying connections.
+
+FANOUT_WORKERS = 16  # Queries in flight at once across all requests of this process
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="fanout")
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def run(sections):
+    # sections maps a name to a function of no arguments; returns ({name: result}, {name: ms}).
+    # Each runs inside the caller's app context and context variables, so the collection
+    # proxies resolve and MongoDB commands are attributed to the calling request.
+    app = current_app._get_current_object()
+
+    def timed(function):
+        with app.app_context():
+            started = time.perf_counter()
+            result = function()
+            return result, round((time.perf_counter() - started) * 1000, 3)
+
+    pool = _get_pool()
+    futures = {
+        name: pool.submit(contextvars.copy_context().run, timed, function)
+        for name, function in sections.items()
+    }
+    results, timings = {}, {}
+    for name, future in futures.items():
+        results[name], timings[name] = future.result()
+    return results, timings
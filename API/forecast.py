@@ -0,0 +1,203 @@
+import argparse
+import calendar
+from datetime import datetime
+import numpy as np
+from pymongo import MongoClient, UpdateOne
+import changes
+import sync
+from fx import BASE_CURRENCY
+
+# Offline batch forecasting of monthly spending for every user, category and currency, written
+# to the predictions collection as documents with source "forecast" (hand-entered predictions
+# are left alone), each in the currency it was spent in. Run it from cron, e.g. nightly:
+#
+#     python forecast.py --uri mongodb://localhost:27017/
+#
+# Monthly spending (Income excluded) comes from the spending_rollups buckets, so the input is one small
+# document per (user, category, month, currency) rather than every transaction; run `python rollups.py rebuild`
+# first if transactions were loaded without going through the API. Users are processed in
+# chunks; within a chunk every series is forecast at once with NumPy:
+#
+#   - a seasonal index per calendar month, measured around a linear trend, for series with at
+#     least two years of history
+#   - Holt's linear exponential smoothing (level + trend) over the deseasonalized totals
+#   - forecast(h) = level + h * trend + season(month h), floored at zero
+
+HISTORY_MONTHS = 24
+SEASON_LENGTH = 12
+ALPHA = 0.5  # Level smoothing: higher follows recent months more closely
+BETA = 0.2   # Trend smoothing
+SEASONAL_PASSES = 3  # Line/season refits; each pass mostly removes what peaks tilted the line by
+CHUNK_USERS = 5000
+SOURCE = "forecast"
+
+
+def month_index(month):
+    # "YYYY-MM" -> months since year 0, so month arithmetic is integer arithmetic
+    return int(month[:4]) * 12 + int(month[5:7]) - 1
+
+
+def month_name(index):
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def build_series(rows, first_month, history):
+    # rows: (userId, category, currency, month, sum) -> one row of monthly totals per (user, category, currency)
+    keys, positions = [], {}
+    cells, columns, values = [], [], []
+    for user_id, category, currency, month, total in rows:
+        column = month_index(month) - first_month
+        if not 0 <= column < history:
+            continue
+        position = positions.get((user_id, category, currency))
+        if position is None:
+            position = positions[(user_id, category, currency)] = len(keys)
+            keys.append((user_id, category, currency))
+        cells.append(position)
+        columns.append(column)
+        values.append(total)
+
+    series = np.zeros((len(keys), history))
+    series[np.array(cells, dtype=int), np.array(columns, dtype=int)] = values
+    return keys, series
+
+
+def forecast(series, first_month, alpha=ALPHA, beta=BETA):
+    # Forecasts the SEASON_LENGTH months after the last column, for every row at once
+    count, history = series.shape
+    columns = np.arange(history)
+    spent = series != 0
+    # A series starts at its first month with spending; earlier months aren't zeros, just absent
+    first = np.where(spent.any(axis=1), spent.argmax(axis=1), history)
+    active = columns[None, :] >= first[:, None]
+    active_months = active.sum(axis=1)
+
+    # Seasonal indexes are each calendar month's average deviation from the series' least-squares
+    # line, so a steady trend isn't read as later months being seasonally higher. The line is
+    # refitted with the season taken out, as a few peak months would otherwise tilt it.
+    slots = (first_month + columns) % SEASON_LENGTH
+    x = np.where(active, columns, 0)
+    n = np.maximum(active_months, 1)
+    sum_x = x.sum(axis=1)
+    spread = n * (x * x).sum(axis=1) - sum_x ** 2
+    seasonal = np.zeros((count, SEASON_LENGTH))
+    for _ in range(SEASONAL_PASSES):
+        adjusted = np.where(active, series - seasonal[:, slots], 0)
+        sum_y = adjusted.sum(axis=1)
+        slope = np.where(spread > 0, (n * (x * adjusted).sum(axis=1) - sum_x * sum_y) / np.where(spread > 0, spread, 1), 0)
+        intercept = (sum_y - slope * sum_x) / n
+        deviations = np.where(active, series - (intercept[:, None] + slope[:, None] * columns), 0)
+        for slot in range(SEASON_LENGTH):
+            in_slot = slots == slot
+            seasonal[:, slot] = deviations[:, in_slot].sum(axis=1) / np.maximum(active[:, in_slot].sum(axis=1), 1)
+        seasonal -= seasonal.mean(axis=1, keepdims=True)
+    seasonal[active_months < 2 * SEASON_LENGTH] = 0
+
+    deseasonalized = series - seasonal[:, slots]
+    level = np.zeros(count)
+    trend = np.zeros(count)
+    for column in range(history):
+        value = deseasonalized[:, column]
+        starting = first == column
+        running = first < column
+        next_level = alpha * value + (1 - alpha) * (level + trend)
+        next_trend = beta * (next_level - level) + (1 - beta) * trend
+        level = np.where(starting, value, np.where(running, next_level, level))
+        trend = np.where(running, next_trend, trend)
+
+    steps = np.arange(1, SEASON_LENGTH + 1)
+    future_slots = (first_month + history - 1 + steps) % SEASON_LENGTH
+    return np.maximum(level[:, None] + steps[None, :] * trend[:, None] + seasonal[:, future_slots], 0)
+
+
+def write_forecasts(predictions, keys, horizon, target_month, generated_at, stamps):
+    year, month = int(target_month[:4]), int(target_month[5:7])
+    days = calendar.monthrange(year, month)[1]
+    operations = [
+        UpdateOne(
+            {"userId": user_id, "category": category, "currency": currency, "source": SOURCE},
+            {
+                "$set": {
+                    "predicted_amount": round(float(months[0]), 2),
+                    "month": target_month,
+                    "forecast": {
+                        "next_week": round(float(months[0]) * 7 / days, 2),
+                        "next_month": round(float(months[0]), 2),
+                        "next_year": round(float(months.sum()), 2)
+                    },
+                    "model": "holt-seasonal",
+                    "generatedAt": generated_at,
+                    "updatedAt": generated_at,
+                    "syncSeq": stamp["syncSeq"],
+                    "syncAt": stamp["syncAt"]
+                },
+                "$setOnInsert": {"createdAt": generated_at}
+            },
+            upsert=True
+        )
+        for (user_id, category, currency), months, stamp in zip(keys, horizon, stamps)
+    ]
+    if operations:
+        predictions.bulk_write(operations, ordered=False)
+
+
+def run(db, user_id=None, history=HISTORY_MONTHS, chunk_users=CHUNK_USERS, now=None):
+    now = now or datetime.utcnow()
+    # Truncated to BSON's milliseconds, or the stale sweep below would take this run's forecasts for older ones
+    generated_at = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    # The current month is still in progress, so history ends with the month before it
+    target = now.year * 12 + now.month - 1
+    first_month = target - history
+    target_month = month_name(target)
+
+    query = {"month": {"$gte": month_name(first_month), "$lt": target_month}}
+    if user_id:
+        query["userId"] = user_id
+    cursor = db["spending_rollups"].find(
+        query, {"_id": 0, "userId": 1, "category": 1, "currency": 1, "month": 1, "sum": 1}
+    )
+    cursor = cursor.sort([("userId", 1), ("category", 1), ("month", 1)]).batch_size(10000)
+
+    def flush(rows):
+        keys, series = build_series(rows, first_month, history)
+        stamps = [{"userId": key[0]} for key in keys]
+        sync.stamp_new(db["change_counters"], stamps)
+        write_forecasts(db["predictions"], keys, forecast(series, first_month), target_month, generated_at, stamps)
+        changes.bump(db["change_counters"], "predictions", *{key[0] for key in keys})
+        return len(keys)
+
+    written, rows, users = 0, [], set()
+    for bucket in cursor:
+        if bucket["userId"] not in users and len(users) >= chunk_users:
+            written += flush(rows)
+            rows, users = [], set()
+        users.add(bucket["userId"])
+        rows.append((bucket["userId"], bucket["category"], bucket.get("currency", BASE_CURRENCY),
+                     bucket["month"], bucket["sum"]))
+    if rows:
+        written += flush(rows)
+
+    # Forecasts this run didn't refresh belong to series with no spending in the window
+    stale = {"source": SOURCE, "generatedAt": {"$lt": generated_at}}
+    if user_id:
+        stale["userId"] = user_id
+    removed = [(doc["_id"], doc["userId"]) for doc in db["predictions"].find(stale, {"userId": 1})]
+    db["predictions"].delete_many({"_id": {"$in": [document_id for document_id, _ in removed]}})
+    changes.bump(db["change_counters"], "predictions", *{user_id for _, user_id in removed})
+    sync.record_deleted(db[sync.TOMBSTONES], db["change_counters"], "predictions", removed)
+    return written, len(removed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Forecast monthly spending for every user and category")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--user-id", help="Only forecast this user")
+    parser.add_argument("--history", type=int, default=HISTORY_MONTHS, help="Months of history to fit")
+    parser.add_argument("--chunk-users", type=int, default=CHUNK_USERS, help="Users forecast per vectorized pass")
+    args = parser.parse_args()
+
+    db = MongoClient(args.uri)["finace_app"]
+    started = datetime.utcnow()
+    written, removed = run(db, args.user_id, args.history, args.chunk_users)
+    elapsed = (datetime.utcnow() - started).total_seconds()
+    print(f"Wrote {written} forecasts and removed {removed} stale ones in {elapsed:.1f}s.")
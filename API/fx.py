@@ -0,0 +1,189 @@
+import csv
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime
+import numpy as np
+from flask import current_app
+
+# Currency conversion from a table of historical exchange rates, loaded from a local CSV
+# file (FX_RATES_FILE) with one row per currency and day:
+#
+#     date,currency,rate
+#     2024-05-01,USD,300.25
+#     2024-05-01,EUR,321.10
+#
+# A rate is the value of one unit of the currency in BASE_CURRENCY; any other pair is
+# crossed through it. A day without a row uses the currency's latest earlier rate (rates
+# older than the first row use the first). In memory each currency is two sorted NumPy
+# arrays, day ordinals and rates, so a lookup is a bisection (np.searchsorted) and a
+# request converts all of its amounts in one vectorized call.
+#
+# The file is checked for changes at most every FX_RELOAD_CHECK_SECONDS and reloaded in
+# place, so rates are updated by replacing the file; a file that fails to load is logged
+# and the previous table stays in use. Without a file only same-currency amounts convert.
+
+BASE_CURRENCY = "LKR"  # Also the currency documents without one are in
+DEFAULTS = {
+    "FX_RATES_FILE": None,
+    "FX_RELOAD_CHECK_SECONDS": 5,
+}
+
+log = logging.getLogger("spendio.fx")
+
+
+class UnknownCurrency(ValueError):
+    pass
+
+
+def day_of(value):
+    # datetime, date or day ordinal -> day ordinal
+    if isinstance(value, (datetime, date)):
+        return value.toordinal()
+    return int(value)
+
+
+class RateTable:
+    def __init__(self, rows=(), version=None):
+        # rows: (date, currency, rate); the last row for a currency and day wins
+        by_currency = {}
+        for day, currency, rate in rows:
+            by_currency.setdefault(currency, {})[day_of(day)] = float(rate)
+        self.series = {}
+        for currency, rates in by_currency.items():
+            days = np.array(sorted(rates), dtype=np.int64)
+            self.series[currency] = (days, np.array([rates[day] for day in days.tolist()]))
+        self.version = version
+
+    @classmethod
+    def load(cls, path):
+        rows = []
+        with open(path, newline="") as f:
+            for line, row in enumerate(csv.DictReader(f), 2):
+                try:
+                    rate = float(row["rate"])
+                    if not rate > 0:
+                        raise ValueError("rate must be positive")
+                    rows.append((date.fromisoformat(row["date"].strip()), row["currency"].strip().upper(), rate))
+                except (KeyError, TypeError, ValueError) as e:
+                    raise ValueError(f"{path}, line {line}: {str(e)}")
+        status = os.stat(path)
+        return cls(rows, version=f"{int(status.st_mtime_ns):x}-{status.st_size:x}")
+
+    def knows(self, currency):
+        return currency == BASE_CURRENCY or currency in self.series
+
+    def require(self, currency):
+        # For a reporting currency asked for by a client
+        if not self.knows(currency):
+            raise UnknownCurrency(f"No exchange rates for '{currency}'")
+        return currency
+
+    def rates(self, currencies, days):
+        # Value in BASE_CURRENCY of one unit of each currency on each day; NaN where unknown
+        currencies = np.asarray(currencies, dtype=object)
+        days = np.asarray(days, dtype=np.int64)
+        result = np.full(len(currencies), np.nan)
+        for currency in set(currencies.tolist()):
+            mask = currencies == currency
+            if currency == BASE_CURRENCY:
+                result[mask] = 1.0
+            elif currency in self.series:
+                known_days, rates = self.series[currency]
+                positions = np.searchsorted(known_days, days[mask], side="right") - 1
+                result[mask] = rates[np.maximum(positions, 0)]
+        return result
+
+    def average_rates(self, currencies, start_days, end_days):
+        # Mean of each currency's daily rates over [start, end), counting days without a row
+        # at the rate in effect, as income and expenses over a period are usually converted
+        currencies = np.asarray(currencies, dtype=object)
+        starts = np.asarray(start_days, dtype=np.int64)
+        ends = np.maximum(np.asarray(end_days, dtype=np.int64), starts + 1)
+        result = np.full(len(currencies), np.nan)
+        for currency in set(currencies.tolist()):
+            mask = currencies == currency
+            if currency == BASE_CURRENCY:
+                result[mask] = 1.0
+            elif currency in self.series:
+                known_days, rates = self.series[currency]
+                # Integral of the step function up to each day: area before each row, plus the rest
+                widths = np.diff(known_days, append=known_days[-1])
+                area = np.concatenate(([0.0], np.cumsum(rates[:-1] * widths[:-1])))
+
+                def integral(day):
+                    position = np.searchsorted(known_days, day, side="right") - 1
+                    before = day < known_days[0]
+                    position = np.maximum(position, 0)
+                    value = area[position] + rates[position] * (day - known_days[position])
+                    # Days before the first row use the first rate
+                    return np.where(before, rates[0] * (day - known_days[0]), value)
+
+                result[mask] = (integral(ends[mask]) - integral(starts[mask])) / (ends[mask] - starts[mask])
+        return result
+
+    # The conversions take parallel sequences and a target currency, or one target per amount.
+    # They return NaN where a rate is missing.
+
+    def convert(self, amounts, currencies, days, targets):
+        # Amounts on the given days
+        return self._convert(amounts, currencies, targets, lambda codes: self.rates(codes, days))
+
+    def convert_periods(self, amounts, currencies, start_days, end_days, targets):
+        # Amounts spread over periods [start, end), at each period's average rates
+        return self._convert(amounts, currencies, targets,
+                             lambda codes: self.average_rates(codes, start_days, end_days))
+
+    def _convert(self, amounts, currencies, targets, rates_for):
+        amounts = np.asarray(amounts, dtype=float)
+        currencies = np.asarray(currencies, dtype=object)
+        if isinstance(targets, str):
+            targets = np.full(len(amounts), targets, dtype=object)
+        targets = np.asarray(targets, dtype=object)
+        if not len(amounts):
+            return amounts
+        converted = amounts * rates_for(currencies) / rates_for(targets)
+        # Same-currency amounts are never touched, even for currencies the table doesn't know
+        return np.where(currencies == targets, amounts, converted)
+
+
+class Rates:
+    def __init__(self, app=None):
+        self.config = None
+        self._table = RateTable()
+        self._checked_at = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        for key, value in DEFAULTS.items():
+            app.config.setdefault(key, value)
+        self.config = app.config
+        app.extensions["fx"] = self
+
+    @property
+    def table(self):
+        path = self.config["FX_RATES_FILE"]
+        now = time.monotonic()
+        if path and (self._checked_at is None or now - self._checked_at >= self.config["FX_RELOAD_CHECK_SECONDS"]):
+            with self._lock:
+                if self._checked_at is None or now - self._checked_at >= self.config["FX_RELOAD_CHECK_SECONDS"]:
+                    self._checked_at = now
+                    self._reload(path)
+        return self._table
+
+    def _reload(self, path):
+        try:
+            status = os.stat(path)
+            if f"{int(status.st_mtime_ns):x}-{status.st_size:x}" != self._table.version:
+                # Readers keep using the old table until the new one is complete
+                self._table = RateTable.load(path)
+                log.info("Loaded exchange rates from %s (%d currencies)", path, len(self._table.series))
+        except (OSError, ValueError) as e:
+            log.warning("Keeping the current exchange rates: %s", e)
+
+
+def current():
+    return current_app.extensions["fx"].table
@@ -0,0 +1,222 @@
+import argparse
+import sys
+from datetime import datetime
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT, MongoClient
+from categories import USAGE
+from pagination import keyset_filter
+from search import TEXT_WEIGHTS
+from sync import TOMBSTONE_TTL_SECONDS
+
+# Indexes every route depends on, per collection: (keys, options)
+INDEXES = {
+    "users": [
+        ([("email", ASCENDING)], {"unique": True}),
+    ],
+    "transactions": [
+        # Serves the (date, _id) keyset order of GET /transactions
+        ([("userId", ASCENDING), ("date", ASCENDING), ("_id", ASCENDING)], {}),
+        # The same order across all users, for GET /transactions without ?user_id=
+        ([("date", DESCENDING), ("_id", DESCENDING)], {}),
+        # Also serves (userId, category) lookups through its prefix
+        ([("userId", ASCENDING), ("category", ASCENDING), ("date", ASCENDING)], {}),
+        # GET /sync reads every synced collection, and the tombstones, by (userId, syncSeq)
+        ([("userId", ASCENDING), ("syncSeq", ASCENDING)], {}),
+        # GET /transactions/search; a collection can have only one text index
+        ([("userId", ASCENDING), ("category", TEXT), ("note", TEXT)],
+         {"name": "transactions_search", "weights": TEXT_WEIGHTS}),
+    ],
+    "budgets": [
+        ([("userId", ASCENDING), ("category", ASCENDING)], {}),
+        # Serves the _id keyset order of GET /budgets
+        ([("userId", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("userId", ASCENDING), ("syncSeq", ASCENDING)], {}),
+    ],
+    "predictions": [
+        ([("userId", ASCENDING), ("category", ASCENDING)], {}),
+        # Serves the _id keyset order of GET /predictions
+        ([("userId", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("userId", ASCENDING), ("syncSeq", ASCENDING)], {}),
+    ],
+    "goals": [
+        ([("userId", ASCENDING), ("deadline", ASCENDING)], {}),
+        ([("userId", ASCENDING), ("syncSeq", ASCENDING)], {}),
+    ],
+    "sync_tombstones": [
+        ([("userId", ASCENDING), ("syncSeq", ASCENDING)], {}),
+        # Expires tombstones; GET /sync sends clients that fell further behind to a full resync
+        ([("deletedAt", ASCENDING)], {"expireAfterSeconds": TOMBSTONE_TTL_SECONDS}),
+    ],
+    "spending_rollups": [
+        ([("userId", ASCENDING), ("category", ASCENDING), ("month", ASCENDING), ("currency", ASCENDING)],
+         {"unique": True}),
+    ],
+    "analytics_buckets": [
+        # Unique: analytics.store relies on it to drop results a concurrent write made stale
+        ([("userId", ASCENDING), ("granularity", ASCENDING), ("start", ASCENDING)], {"unique": True}),
+    ],
+    USAGE: [
+        ([("userId", ASCENDING), ("key", ASCENDING)], {"unique": True}),
+        # Serves categories.load's most-used-first order
+        ([("userId", ASCENDING), ("count", DESCENDING), ("lastUsed", DESCENDING)], {}),
+    ],
+}
+
+# Indexes replaced by one above, dropped by ensure_indexes: (collection, index name)
+RETIRED_INDEXES = [
+    # Rollups are kept per currency; this one would reject a second currency's bucket
+    ("spending_rollups", "userId_1_category_1_month_1"),
+    # Usage is counted per normalized category
+    (USAGE, "userId_1_category_1"),
+]
+
+# The queries each route sends, used to check that none of them falls back to a collection
+# scan or sorts in memory: (route, collection, {"filter", "sort"} for a find, or {"pipeline"})
+SAMPLE_USER = "000000000000000000000000"
+SAMPLE_DAY = datetime(2000, 1, 1)
+TRANSACTION_ORDER = [("date", -1), ("_id", -1)]
+ID_ORDER = [("_id", 1)]
+LIST_AFTER = keyset_filter(ID_ORDER, [ObjectId(SAMPLE_USER)])  # A second page of an _id-ordered list
+TRANSACTIONS_AFTER = keyset_filter(TRANSACTION_ORDER, [SAMPLE_DAY, ObjectId(SAMPLE_USER)])
+MONTH = {"$gte": SAMPLE_DAY, "$lt": datetime(2000, 2, 1)}
+ROUTE_QUERIES = [
+    ("POST /register, POST /login", "users", {"filter": {"email": "someone@example.com"}}),
+    ("GET /users", "users", {"filter": LIST_AFTER, "sort": ID_ORDER}),
+    ("GET /transactions", "transactions", {"filter": {"userId": SAMPLE_USER}, "sort": TRANSACTION_ORDER}),
+    ("GET /transactions", "transactions",
+     {"filter": {"$and": [{"userId": SAMPLE_USER, "date": MONTH}, TRANSACTIONS_AFTER]}, "sort": TRANSACTION_ORDER}),
+    ("GET /transactions without user_id", "transactions", {"filter": {}, "sort": TRANSACTION_ORDER}),
+    ("GET /transactions without user_id", "transactions",
+     {"filter": {"$and": [{}, TRANSACTIONS_AFTER]}, "sort": TRANSACTION_ORDER}),
+    ("GET /transactions/export", "transactions",
+     {"filter": {"userId": SAMPLE_USER, "date": {"$gte": SAMPLE_DAY}}, "sort": [("date", 1), ("_id", 1)]}),
+    ("GET /budgets", "budgets", {"filter": {"$and": [{"userId": SAMPLE_USER}, LIST_AFTER]}, "sort": ID_ORDER}),
+    ("GET /predictions", "predictions",
+     {"filter": {"$and": [{"userId": SAMPLE_USER}, LIST_AFTER]}, "sort": ID_ORDER}),
+    ("GET /goals", "goals", {"filter": {"userId": SAMPLE_USER}}),
+    ("GET /users/<id>/summary goals", "goals", {"filter": {"userId": SAMPLE_USER}, "sort": [("deadline", 1)]}),
+    ("GET /users/<id>/summary recent transactions", "transactions",
+     {"filter": {"userId": SAMPLE_USER}, "sort": TRANSACTION_ORDER}),
+    ("GET /budgets/status", "budgets", {"pipeline": [
+        {"$match": {"userId": SAMPLE_USER, "$or": [{"yearMonth": {"$exists": False}}, {"yearMonth": "2000-01"}]}},
+    ]}),
+    # The $lookup sub-pipeline of GET /budgets/status, which explain doesn't descend into
+    ("GET /budgets/status spending", "transactions", {"pipeline": [
+        {"$match": {"userId": SAMPLE_USER, "date": MONTH, "type": {"$ne": "Income"}}},
+        {"$group": {"_id": {"category": "$category", "currency": "$currency"}, "spent": {"$sum": "$amount"}}},
+    ]}),
+    ("GET /predictive-analysis", "transactions", {"pipeline": [
+        {"$match": {"userId": SAMPLE_USER, "date": {"$gte": SAMPLE_DAY}}},
+        {"$group": {"_id": {"category": "$category", "day": {"$dateTrunc": {"date": "$date", "unit": "day"}}},
+                    "total": {"$sum": "$amount"}, "count": {"$sum": 1}}},
+    ]}),
+    ("GET /predictive-analysis forecasts", "predictions", {"filter": {"userId": SAMPLE_USER, "source": "forecast"}}),
+    ("rollup bounds refresh", "transactions", {"pipeline": [
+        {"$match": {"userId": SAMPLE_USER, "category": "Food", "date": MONTH, "type": {"$ne": "Income"},
+                    "currency": "USD"}},
+        {"$group": {"_id": None, "min": {"$min": "$amount"}, "max": {"$max": "$amount"}}},
+    ]}),
+    ("transaction writes", "spending_rollups",
+     {"filter": {"userId": SAMPLE_USER, "category": "Food", "month": "2000-01", "currency": "LKR"}}),
+    ("transaction writes", "analytics_buckets",
+     {"filter": {"userId": SAMPLE_USER, "granularity": "month", "start": SAMPLE_DAY}}),
+    ("GET /analytics/spending", "analytics_buckets",
+     {"filter": {"userId": SAMPLE_USER, "granularity": "month",
+                 "start": {"$gte": SAMPLE_DAY, "$lte": datetime(2000, 12, 1)}}}),
+    ("GET /analytics/spending", "transactions", {"pipeline": [
+        {"$match": {"userId": SAMPLE_USER, "$or": [{"date": MONTH},
+                                                   {"date": {"$gte": datetime(2000, 6, 1), "$lt": datetime(2000, 7, 1)}}]}},
+        {"$group": {"_id": {"start": {"$dateTrunc": {"date": "$date", "unit": "month"}}, "category": "$category"},
+                    "total": {"$sum": "$amount"}, "count": {"$sum": 1}}},
+    ]}),
+    # Ranking by text score is necessarily a sort of the user's matches
+    ("GET /transactions/search", "transactions", {"pipeline": [
+        {"$match": {"userId": SAMPLE_USER, "$text": {"$search": "lunch"}}},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+        {"$sort": {"score": -1, "date": -1, "_id": -1}},
+        {"$limit": 101},
+    ], "sorts": True}),
+    ("transaction writes", USAGE, {"filter": {"userId": SAMPLE_USER, "key": "food"}}),
+    ("GET /categories/suggest", USAGE,
+     {"filter": {"userId": SAMPLE_USER}, "sort": [("count", -1), ("lastUsed", -1)]}),
+    *(("GET /sync", name, {"filter": {"userId": SAMPLE_USER, "syncSeq": {"$gt": 0}}, "sort": [("syncSeq", 1)]})
+      for name in ("transactions", "budgets", "goals", "predictions", "sync_tombstones")),
+]
+
+
+def ensure_indexes(db):
+    # create_index is a no-op for indexes that already exist
+    for collection_name, name in RETIRED_INDEXES:
+        if name in db[collection_name].index_information():
+            db[collection_name].drop_index(name)
+    created = []
+    for collection_name, indexes in INDEXES.items():
+        for keys, options in indexes:
+            created.append(db[collection_name].create_index(keys, **options))
+    return created
+
+
+def _winning_stages(explain):
+    # Every stage of every winning plan in an explain result, for finds and pipelines alike
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "winningPlan":
+                yield from _plan_stages(value)
+            else:
+                yield from _winning_stages(value)
+    elif isinstance(explain, list):
+        for item in explain:
+            yield from _winning_stages(item)
+
+
+def _plan_stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+def explain(db, collection_name, shape):
+    if "pipeline" in shape:
+        return db.command("explain", {"aggregate": collection_name, "pipeline": shape["pipeline"], "cursor": {}},
+                          verbosity="queryPlanner")
+    cursor = db[collection_name].find(shape["filter"])
+    if shape.get("sort"):
+        cursor = cursor.sort(shape["sort"])
+    return cursor.explain()
+
+
+def unindexed_queries(db):
+    # Returns (route, collection, shape, problem) for every route query whose winning plan
+    # scans a collection or sorts in memory; tests/test_indexes.py expects none
+    failures = []
+    for route, collection_name, shape in ROUTE_QUERIES:
+        stages = set(_winning_stages(explain(db, collection_name, shape)))
+        if "COLLSCAN" in stages:
+            failures.append((route, collection_name, shape, "COLLSCAN"))
+        elif "SORT" in stages and not shape.get("sorts"):
+            failures.append((route, collection_name, shape, "in-memory SORT"))
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Create and verify the API's MongoDB indexes")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/")
+    parser.add_argument("command", choices=["ensure", "verify"])
+    args = parser.parse_args()
+
+    db = MongoClient(args.uri)["finace_app"]
+    if args.command == "ensure":
+        for name in ensure_indexes(db):
+            print(f"Index '{name}' is in place.")
+    elif args.command == "verify":
+        failures = unindexed_queries(db)
+        for route, collection_name, shape, problem in failures:
+            print(f"{route}: {problem} on '{collection_name}' for {shape}")
+        if failures:
+            sys.exit(1)
+        print(f"All {len(ROUTE_QUERIES)} route queries use an index.")
@@ -0,0 +1,258 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from flask import Response, g, request
+from pymongo import monitoring
+
+# Request and MongoDB instrumentation, exposed in Prometheus text format on /metrics.
+# Every request records its latency under the route's rule (e.g. /transactions/<transaction_id>),
+# and every MongoDB command it issues is counted, timed and sized under the same route, so a
+# slow route can be split into time spent in MongoDB and time spent in Python.
+#
+# With SLOW_REQUEST_MS set, requests slower than that are logged to the "spendio.slow" logger
+# together with the shape of each query they ran (field names and operators, values elided).
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COMMAND_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+UNATTRIBUTED = "unattributed"  # Commands outside a request, e.g. getMores while a response streams
+SHAPE_FIELDS = ("filter", "sort", "projection", "pipeline", "query", "updates", "deletes", "documents")
+
+slow_log = logging.getLogger("spendio.slow")
+
+# The request being handled in this thread, so pymongo's listener can attribute commands to it
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+def query_shape(value, keep_values=False):
+    # The structure of a command argument with its values elided, so queries group by shape
+    if isinstance(value, dict):
+        return {
+            key: query_shape(item, keep_values or key in ("sort", "projection", "$sort", "$project"))
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [query_shape(item, keep_values) for item in value]
+        return ["?"] if value else []
+    if keep_values and isinstance(value, (int, float, str)):
+        return value
+    return "?"
+
+
+def returned_documents(command_name, reply):
+    cursor = reply.get("cursor")
+    if cursor is not None:
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+    if command_name in ("findAndModify", "findandmodify"):
+        return 1 if reply.get("value") else 0
+    return 0
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.total}'
+        yield f"{name}_sum{{{labels}}} {self.sum:.6f}"
+        yield f"{name}_count{{{labels}}} {self.total}"
+
+
+class RequestStats:
+    def __init__(self, route, method, record_shapes):
+        self.route = route
+        self.method = method
+        self.record_shapes = record_shapes
+        self.started = time.perf_counter()
+        self.mongo_seconds = 0.0
+        self.commands = []
+        self._lock = threading.Lock()  # fanout.py runs one request's queries on several threads
+
+    def add_command(self, seconds, command):
+        with self._lock:
+            self.mongo_seconds += seconds
+            self.commands.append(command)
+
+
+class Registry:
+    # All series of this process, keyed by their label values
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}            # (route, method, status) -> count
+        self.request_seconds = {}     # (route, method) -> Histogram
+        self.request_mongo_seconds = {}  # (route, method) -> Histogram of MongoDB time per request
+        self.commands = {}            # (route, command, collection) -> count
+        self.command_failures = {}    # (route, command, collection) -> count
+        self.command_seconds = {}     # (route, command, collection) -> Histogram
+        self.command_documents = {}   # (route, command, collection) -> documents returned
+        self.collectors = []          # Callables appending other extensions' series to the output lines
+
+    def observe_request(self, stats, status, seconds):
+        with self._lock:
+            key = (stats.route, stats.method)
+            self.requests[key + (status,)] = self.requests.get(key + (status,), 0) + 1
+            self.request_seconds.setdefault(key, Histogram(REQUEST_BUCKETS)).observe(seconds)
+            self.request_mongo_seconds.setdefault(key, Histogram(REQUEST_BUCKETS)).observe(stats.mongo_seconds)
+
+    def observe_command(self, key, seconds, documents, failed):
+        with self._lock:
+            self.commands[key] = self.commands.get(key, 0) + 1
+            self.command_seconds.setdefault(key, Histogram(COMMAND_BUCKETS)).observe(seconds)
+            self.command_documents[key] = self.command_documents.get(key, 0) + documents
+            if failed:
+                self.command_failures[key] = self.command_failures.get(key, 0) + 1
+
+    def render(self):
+        with self._lock:
+            lines = []
+            counter(lines, "spendio_http_requests_total", "Requests handled, by route and status",
+                    self.requests, ("route", "method", "status"))
+            histogram(lines, "spendio_http_request_duration_seconds", "Request latency until the response is built",
+                      self.request_seconds, ("route", "method"))
+            histogram(lines, "spendio_http_request_mongo_seconds", "MongoDB command time per request, summed over queries run in parallel",
+                      self.request_mongo_seconds, ("route", "method"))
+            counter(lines, "spendio_mongo_commands_total", "MongoDB commands, by the route that issued them",
+                    self.commands, ("route", "command", "collection"))
+            counter(lines, "spendio_mongo_command_failures_total", "MongoDB commands that failed",
+                    self.command_failures, ("route", "command", "collection"))
+            histogram(lines, "spendio_mongo_command_duration_seconds", "MongoDB command round-trip time",
+                      self.command_seconds, ("route", "command", "collection"))
+            counter(lines, "spendio_mongo_documents_returned_total", "Documents MongoDB sent back in replies",
+                    self.command_documents, ("route", "command", "collection"))
+            for collect in self.collectors:
+                collect(lines)
+            return "\n".join(lines) + "\n"
+
+
+def label_string(names, values):
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+def counter(lines, name, help_text, series, label_names):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} counter")
+    for values, count in sorted(series.items()):
+        lines.append(f"{name}{{{label_string(label_names, values)}}} {count}")
+
+
+def histogram(lines, name, help_text, series, label_names):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for values, hist in sorted(series.items()):
+        lines.extend(hist.lines(name, label_string(label_names, values)))
+
+
+class CommandMetrics(monitoring.CommandListener):
+    # pymongo calls these on the thread that runs the command: the request's own thread, or a
+    # fanout.py worker running one of its queries with a copy of its context variables
+    def __init__(self, registry):
+        self.registry = registry
+        self.local = threading.local()
+
+    def started(self, event):
+        # Replies don't say which collection or query they answer, so note both until the reply arrives
+        command = event.command
+        stats = current_request.get()
+        shape = None
+        if stats is not None and stats.record_shapes:
+            shape = {
+                field: query_shape(command[field], field in ("sort", "projection"))
+                for field in SHAPE_FIELDS if field in command
+            }
+        pending = self.local.__dict__.setdefault("pending", {})
+        pending[(event.connection_id, event.request_id)] = (collection_of(event.command_name, command), shape)
+
+    def succeeded(self, event):
+        self.finish(event, returned_documents(event.command_name, event.reply), False)
+
+    def failed(self, event):
+        self.finish(event, 0, True)
+
+    def finish(self, event, documents, failed):
+        stats = current_request.get()
+        seconds = event.duration_micros / 1e6
+        pending = self.local.__dict__.setdefault("pending", {})
+        collection, shape = pending.pop((event.connection_id, event.request_id), ("", None))
+        route = stats.route if stats is not None else UNATTRIBUTED
+        self.registry.observe_command((route, event.command_name, collection), seconds, documents, failed)
+        if stats is not None:
+            stats.add_command(seconds, {
+                "command": event.command_name,
+                "collection": collection,
+                "ms": round(seconds * 1000, 3),
+                "documents": documents,
+                "failed": failed,
+                **({"shape": shape} if shape else {})
+            })
+
+
+def collection_of(command_name, command):
+    # {"find": "transactions", ...}, but {"getMore": <cursor id>, "collection": "transactions"}
+    name = command.get(command_name)
+    return name if isinstance(name, str) else command.get("collection", "")
+
+
+class Metrics:
+    def __init__(self, app=None):
+        self.registry = Registry()
+        self.commands = CommandMetrics(self.registry)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("SLOW_REQUEST_MS", None)
+        self.slow_request_ms = app.config["SLOW_REQUEST_MS"]
+        app.extensions["metrics"] = self
+        app.extensions["mongo"].event_listeners.append(self.commands)
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+        app.add_url_rule("/metrics", "metrics", self.render)
+
+    def before_request(self):
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        g.metrics_token = current_request.set(RequestStats(route, request.method, bool(self.slow_request_ms)))
+
+    def after_request(self, response):
+        stats = current_request.get()
+        if stats is None:
+            return response
+        seconds = time.perf_counter() - stats.started
+        self.registry.observe_request(stats, response.status_code, seconds)
+        if self.slow_request_ms and seconds * 1000 >= float(self.slow_request_ms):
+            slow_log.warning(json.dumps({
+                "route": stats.route,
+                "method": stats.method,
+                "path": request.full_path.rstrip("?"),
+                "status": response.status_code,
+                "ms": round(seconds * 1000, 3),
+                "mongo_ms": round(stats.mongo_seconds * 1000, 3),
+                "commands": stats.commands
+            }, default=str))
+        return response
+
+    def teardown_request(self, exc):
+        token = g.pop("metrics_token", None)
+        if token is not None:
+            current_request.reset(token)
+
+    def render(self):
+        return Response(self.registry.render(), mimetype="text/plain; version=0.0.4")
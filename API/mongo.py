@@ -0,0 +1,133 @@
+import os
+import threading
+from pymongo import MongoClient, monitoring
+
+# MongoDB connection management for the app factory. The client is created on first use
+# in each process, never at import or in create_app, so pre-fork servers (gunicorn,
+# uvicorn --workers) give every worker its own client and connection pool instead of
+# inheriting sockets from the parent.
+
+DEFAULTS = {
+    "MONGO_URI": "mongodb://localhost:27017/",
+    "MONGO_DB": "finace_app",
+    "MONGO_MAX_POOL_SIZE": 100,
+    "MONGO_MIN_POOL_SIZE": 0,
+    "MONGO_WAIT_QUEUE_TIMEOUT_MS": 2000,  # How long a request waits for a free pooled connection
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": 5000,
+    "MONGO_CONNECT_TIMEOUT_MS": 5000,
+    "MONGO_READ_PREFERENCE": "primary",
+    # Called as factory(uri, **options); point it at an in-memory stand-in in tests
+    "MONGO_CLIENT_FACTORY": MongoClient,
+}
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    # Connection pool counters for this process
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.created = 0
+            self.closed = 0
+            self.checked_out = 0
+            self.checkouts = 0
+            self.checkout_failures = {}
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "connections_open": self.created - self.closed,
+                "connections_created": self.created,
+                "connections_checked_out": self.checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failures": dict(self.checkout_failures)
+            }
+
+    def connection_created(self, event):
+        with self._lock:
+            self.created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.closed += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+            self.checkouts += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            reason = str(event.reason)
+            self.checkout_failures[reason] = self.checkout_failures.get(reason, 0) + 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+
+class Mongo:
+    def __init__(self, app=None):
+        self.config = None
+        self.pool_stats = PoolStats()
+        self.event_listeners = [self.pool_stats]  # Register more (e.g. command listeners) before first use
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        for key, value in DEFAULTS.items():
+            app.config.setdefault(key, value)
+        self.config = app.config
+        app.extensions["mongo"] = self
+
+    def client_options(self):
+        return {
+            "maxPoolSize": self.config["MONGO_MAX_POOL_SIZE"],
+            "minPoolSize": self.config["MONGO_MIN_POOL_SIZE"],
+            "waitQueueTimeoutMS": self.config["MONGO_WAIT_QUEUE_TIMEOUT_MS"],
+            "serverSelectionTimeoutMS": self.config["MONGO_SERVER_SELECTION_TIMEOUT_MS"],
+            "connectTimeoutMS": self.config["MONGO_CONNECT_TIMEOUT_MS"],
+            "readPreference": self.config["MONGO_READ_PREFERENCE"],
+            "event_listeners": list(self.event_listeners)
+        }
+
+    @property
+    def client(self):
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    # A client inherited across fork is unusable in the child; drop it without closing
+                    # the parent's sockets and start this process's own pool
+                    self.pool_stats.reset()
+                    factory = self.config["MONGO_CLIENT_FACTORY"]
+                    self._client = factory(self.config["MONGO_URI"], **self.client_options())
+                    self._pid = os.getpid()
+        return self._client
+
+    @property
+    def db(self):
+        return self.client[self.config["MONGO_DB"]]
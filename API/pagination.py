@@ -0,0 +1,63 @@
+import base64
+from bson import json_util
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+
+# Keyset pagination over a fixed sort order. The "after" cursor is an opaque
+# token carrying the sort-key values of the last document on the previous page,
+# so each page is a bounded index range scan no matter how deep the client pages.
+# Values are written as MongoDB Extended JSON, so BSON dates survive the round trip.
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(document, sort):
+    values = [str(document["_id"]) if field == "_id" else document.get(field) for field, _ in sort]
+    return base64.urlsafe_b64encode(json_util.dumps(values, json_options=json_util.RELAXED_JSON_OPTIONS).encode()).decode()
+
+
+def decode_cursor(token, sort):
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(token.encode()))
+        if not isinstance(values, list) or len(values) != len(sort):
+            raise InvalidCursor(f"Invalid cursor: {token}")
+        return [ObjectId(value) if field == "_id" else value for (field, _), value in zip(sort, values)]
+    except (ValueError, TypeError, InvalidId):
+        raise InvalidCursor(f"Invalid cursor: {token}")
+
+
+def keyset_filter(sort, values):
+    # Documents strictly after the cursor in sort order:
+    # (a > x) or (a == x and b > y) or ...
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {f: v for (f, _), v in zip(sort[:i], values[:i])}
+        clause[field] = {"$gt" if direction > 0 else "$lt": values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+
+def projection_for(fields, sort, hidden=()):
+    # fields is the comma-separated ?fields= value; sort keys are always kept for the cursor
+    # and hidden fields never are, even when asked for
+    if not fields:
+        return {field: 0 for field in hidden} or None
+    projection = {field.strip(): 1 for field in fields.split(",") if field.strip() and field.strip() not in hidden}
+    for field, _ in sort:
+        projection[field] = 1
+    return projection
+
+
+def find_page(collection, query, sort, limit=DEFAULT_PAGE_SIZE, after=None, projection=None):
+    if after:
+        query = {"$and": [query, keyset_filter(sort, decode_cursor(after, sort))]}
+
+    # Fetch one extra document to learn whether another page follows
+    documents = list(collection.find(query, projection).sort(sort).limit(limit + 1))
+    next_cursor = encode_cursor(documents[limit - 1], sort) if len(documents) > limit else None
+    return documents[:limit], next_cursor
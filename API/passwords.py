@@ -0,0 +1,81 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Password hashing runs on a small process pool, so the deliberately slow hash functions
+# burn at most PASSWORD_HASH_WORKERS CPUs however many logins arrive together, and never
+# hold the GIL that the request threads serving everything else need.
+#
+# The request thread asking for a hash still waits for its result. At most
+# PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE threads can be waiting like that; once every
+# slot is taken, further register and login requests are refused at once with HashingBusy
+# (503 and Retry-After) rather than parking more threads behind the pool.
+
+PASSWORD_HASH_METHOD = "scrypt:32768:8:1"  # werkzeug method string: algorithm and work factors
+PASSWORD_HASH_WORKERS = 2  # Concurrent hashes, one CPU each
+PASSWORD_HASH_QUEUE = 8  # Hashes allowed to wait for a worker before callers are turned away
+
+
+class HashingBusy(Exception):
+    pass
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE)
+
+
+def configure(method=None, workers=None, queue=None):
+    global PASSWORD_HASH_METHOD, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE, _slots, _pool
+    with _pool_lock:
+        PASSWORD_HASH_METHOD = method or PASSWORD_HASH_METHOD
+        PASSWORD_HASH_WORKERS = workers or PASSWORD_HASH_WORKERS
+        PASSWORD_HASH_QUEUE = queue if queue is not None else PASSWORD_HASH_QUEUE
+        _slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE)
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+
+
+def _get_pool():
+    # Created on first use in each process, so pre-fork servers never share a pool across
+    # workers. Hash processes are spawned fresh rather than forked from a server that has
+    # threads and open MongoDB sockets.
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _run(function, *args):
+    slots = _slots
+    if not slots.acquire(blocking=False):
+        raise HashingBusy("Too many password operations in progress, try again shortly")
+    try:
+        return _get_pool().submit(function, *args).result()
+    finally:
+        slots.release()
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    # werkzeug hashes look like "<method>$<salt>$<hash>", the method with every parameter
+    # spelled out ("scrypt:32768:8:1"). A shorthand setting such as "scrypt" or
+    # "pbkdf2:sha256" leaves the rest to werkzeug's defaults, so only the parts it names count.
+    configured = PASSWORD_HASH_METHOD.split(":")
+    return password_hash.split("$", 1)[0].split(":")[:len(configured)] != configured
@@ -0,0 +1,166 @@
+import argparse
+from datetime import datetime
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from fx import BASE_CURRENCY
+from storage import to_float
+
+# Per-user monthly spending rollups, one document per (userId, category, month, currency)
+# holding a running sum, count, min and max of transaction amounts in that currency; they are
+# converted by whoever reads them, as amounts in different currencies can't be added up.
+# Income isn't spending, so Income transactions are left out, as budget status leaves them out.
+# The transaction write handlers keep them current with $inc deltas. Bucket values are
+# doubles even though transaction amounts are Decimal128: they are summaries read by the
+# forecasts and predictive analysis, which do float arithmetic anyway.
+
+
+def month_of(date):
+    # Dates are BSON dates; ISO strings are only left on documents the storage backfill hasn't reached
+    if isinstance(date, datetime):
+        return date.strftime("%Y-%m")
+    return date[:7]
+
+
+def month_range(month):
+    # Date range covering every moment inside the given "YYYY-MM" month (UTC)
+    year, mon = int(month[:4]), int(month[5:7])
+    next_month = datetime(year + 1, 1, 1) if mon == 12 else datetime(year, mon + 1, 1)
+    return {"$gte": datetime(year, mon, 1), "$lt": next_month}
+
+
+def is_spending(transaction):
+    return transaction.get("type") != "Income"
+
+
+def bucket_key(transaction):
+    return {
+        "userId": transaction["userId"],
+        "category": transaction["category"],
+        "month": month_of(transaction["date"]),
+        "currency": transaction.get("currency") or BASE_CURRENCY
+    }
+
+
+def add(rollups, transaction):
+    if not is_spending(transaction):
+        return
+    amount = to_float(transaction["amount"])
+    rollups.update_one(
+        bucket_key(transaction),
+        {
+            "$inc": {"sum": amount, "count": 1},
+            "$min": {"min": amount},
+            "$max": {"max": amount}
+        },
+        upsert=True
+    )
+
+
+def add_many(rollups, transactions):
+    # Fold a batch into one delta per bucket and apply them in a single bulk_write
+    deltas = {}
+    for transaction in filter(is_spending, transactions):
+        key = bucket_key(transaction)
+        amount = to_float(transaction["amount"])
+        bucket = deltas.setdefault(tuple(key.values()), [key, 0.0, 0, amount, amount])
+        bucket[1] += amount
+        bucket[2] += 1
+        bucket[3] = min(bucket[3], amount)
+        bucket[4] = max(bucket[4], amount)
+
+    operations = [
+        UpdateOne(
+            key,
+            {"$inc": {"sum": total, "count": count}, "$min": {"min": low}, "$max": {"max": high}},
+            upsert=True
+        )
+        for key, total, count, low, high in deltas.values()
+    ]
+    if operations:
+        rollups.bulk_write(operations, ordered=False)
+
+
+def remove(rollups, transactions, transaction):
+    if not is_spending(transaction):
+        return
+    key = bucket_key(transaction)
+    amount = to_float(transaction["amount"])
+    bucket = rollups.find_one_and_update(
+        key,
+        {"$inc": {"sum": -amount, "count": -1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not bucket:
+        return
+
+    if bucket["count"] <= 0:
+        rollups.delete_one({**key, "count": {"$lte": 0}})
+    elif amount <= bucket["min"] or amount >= bucket["max"]:
+        # Min/max can't be decremented, so re-read them from this one bucket
+        refresh_bounds(rollups, transactions, key)
+
+
+def move(rollups, transactions, old, new):
+    # Called after a PUT with the document before and after the update
+    if bucket_key(old) == bucket_key(new) and to_float(old["amount"]) == to_float(new["amount"]) \
+            and is_spending(old) == is_spending(new):
+        return
+    remove(rollups, transactions, old)
+    add(rollups, new)
+
+
+def refresh_bounds(rollups, transactions, key):
+    # Transactions without a currency are in the base currency
+    currency = {"$in": [BASE_CURRENCY, None]} if key["currency"] == BASE_CURRENCY else key["currency"]
+    pipeline = [
+        {"$match": {"userId": key["userId"], "category": key["category"], "date": month_range(key["month"]),
+                    "type": {"$ne": "Income"}, "currency": currency}},
+        {"$group": {"_id": None, "min": {"$min": "$amount"}, "max": {"$max": "$amount"}}}
+    ]
+    rows = list(transactions.aggregate(pipeline))
+    if rows:
+        rollups.update_one(key, {"$set": {"min": to_float(rows[0]["min"]), "max": to_float(rows[0]["max"])}})
+
+
+def rebuild(rollups, transactions, user_id=None):
+    # Recompute rollups from raw transactions to repair drift
+    query = {"userId": user_id} if user_id else {}
+    pipeline = [
+        {"$match": {**query, "type": {"$ne": "Income"}}},
+        {"$group": {
+            "_id": {
+                "userId": "$userId",
+                "category": "$category",
+                # $toDate also reads the ISO strings of documents the storage backfill hasn't reached
+                "month": {"$dateToString": {"format": "%Y-%m", "date": {"$toDate": "$date"}}},
+                "currency": {"$ifNull": ["$currency", BASE_CURRENCY]}
+            },
+            "sum": {"$sum": "$amount"},
+            "count": {"$sum": 1},
+            "min": {"$min": "$amount"},
+            "max": {"$max": "$amount"}
+        }}
+    ]
+    rows = [
+        {**row["_id"], "sum": to_float(row["sum"]), "count": row["count"],
+         "min": to_float(row["min"]), "max": to_float(row["max"])}
+        for row in transactions.aggregate(pipeline, allowDiskUse=True)
+    ]
+
+    rollups.delete_many(query)
+    if rows:
+        rollups.insert_many(rows)
+    return len(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Maintain per-user monthly spending rollups")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = subcommands.add_parser("rebuild", help="Recompute rollups from raw transactions")
+    rebuild_parser.add_argument("--user-id", help="Only rebuild this user's rollups")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/")
+    args = parser.parse_args()
+
+    db = MongoClient(args.uri)["finace_app"]
+    if args.command == "rebuild":
+        count = rebuild(db["spending_rollups"], db["transactions"], args.user_id)
+        print(f"Rebuilt {count} rollup buckets.")
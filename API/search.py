@@ -0,0 +1,37 @@
+import pagination
+
+# Full-text search over a user's transactions (GET /transactions/search), served by the
+# compound text index on (userId, category, note) in indexes.py. The userId prefix keeps a
+# search inside that user's index entries, and is why every $text query must name one user.
+#
+# The text index matches whole words, stemmed as English ("groceries" finds "grocery"),
+# with "quoted phrases" and -excluded words; completing a partly typed category is what
+# /categories/suggest is for. Results are ranked by text score, a category match weighing
+# more than a note match, then newest first. The score isn't a stored field, so pages are
+# an aggregation that computes it before applying the keyset cursor of pagination.py.
+
+SEARCH_SORT = [("score", -1), ("date", -1), ("_id", -1)]
+MAX_QUERY_LENGTH = 200
+TEXT_WEIGHTS = {"category": 3, "note": 1}
+
+
+def search_page(transactions, user_id, text, limit=pagination.DEFAULT_PAGE_SIZE, after=None, projection=None):
+    # Returns (documents, next cursor), each document with its "score"
+    pipeline = [
+        {"$match": {"userId": user_id, "$text": {"$search": text}}},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+    ]
+    if after:
+        values = pagination.decode_cursor(after, SEARCH_SORT)
+        pipeline.append({"$match": pagination.keyset_filter(SEARCH_SORT, values)})
+    pipeline += [
+        {"$sort": dict(SEARCH_SORT)},
+        # One extra document to learn whether another page follows
+        {"$limit": limit + 1},
+    ]
+    if projection:
+        pipeline.append({"$project": projection})
+
+    documents = list(transactions.aggregate(pipeline))
+    next_cursor = pagination.encode_cursor(documents[limit - 1], SEARCH_SORT) if len(documents) > limit else None
+    return documents[:limit], next_cursor
@@ -0,0 +1,74 @@
+import json
+from datetime import datetime, timezone
+from bson.decimal128 import Decimal128
+from bson.objectid import ObjectId
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # Optional: the standard library encoder is used instead
+    orjson = None
+
+# JSON encoding for API responses. MongoDB values with no JSON type (ObjectId, datetime, Decimal128)
+# are converted by the encoder while it writes, in the same single pass over the document,
+# so handlers return documents as they come from the driver: no copy, no pre-pass.
+# orjson is used when installed; the output is the same either way:
+#
+#     ObjectId("65f...")              -> "65f..."
+#     datetime(2024, 5, 1, 12, 30)    -> "2024-05-01T12:30:00Z"  (naive values are UTC)
+#     Decimal128("1250.50")           -> 1250.5
+#
+# Dates a client wrote keep the form it wrote them in: storage.to_wire() puts them back first.
+
+
+def convert(value):
+    # Called by the encoder only for values it can't write itself
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat() + "Z"
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+_encoder = json.JSONEncoder(default=convert, ensure_ascii=False, separators=(",", ":"))
+
+
+def dumps(value):
+    # Returns UTF-8 bytes, ready to send
+    if orjson is not None:
+        return orjson.dumps(value, default=convert, option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z)
+    return _encoder.encode(value).encode()
+
+
+def plain(value):
+    # One value as it should appear outside JSON, e.g. in a CSV cell
+    if isinstance(value, (ObjectId, datetime, Decimal128)):
+        return convert(value)
+    return value
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(JSONProvider):
+    # Installed as app.json, so jsonify() and request.json go through dumps/loads above
+    mimetype = "application/json"
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        if args and kwargs:
+            raise TypeError("jsonify() behavior undefined when passed both args and kwargs")
+        obj = kwargs or (args[0] if len(args) == 1 else list(args) or None)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
@@ -0,0 +1,222 @@
+import argparse
+import time
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+from bson.decimal128 import Decimal128
+from pymongo import MongoClient, UpdateOne
+
+# Typed storage: dates are BSON Dates (naive, as pymongo returns them) and money amounts
+# are Decimal128, so MongoDB can range-scan and $dateTrunc dates and sum amounts exactly.
+# Clients keep sending and receiving ISO-8601 strings and JSON numbers; the handlers convert
+# on the way in with the helpers below and serialize.py converts on the way out.
+#
+# Dates the client writes (a transaction's date, a goal's deadline) are sent back the way it
+# wrote them. The app sends its own wall-clock time without an offset, and a date alone for
+# days, so each document records the form of each of these in "dateFormats":
+#
+#     "2024-05-01T18:30:00.123"   -> stored as is                 "local": sent back without an offset
+#     "2025-12-31"                -> stored as 2025-12-31 00:00   "date": sent back as "2025-12-31"
+#     "2024-05-01T13:00:00Z"      -> stored in UTC                "utc": sent back in UTC, with Z
+#
+# to_wire() applies them to documents on the way out. Timestamps the server sets (createdAt,
+# updatedAt) are UTC and go out with Z, as they always have.
+#
+# Documents written before the switch are converted in place by
+#
+#     python storage.py backfill [--batch-size 500] [--max-rate 2000]
+#
+# which walks each collection in _id order, one BSON type of _id at a time (a range query
+# never crosses types), checkpoints after every batch (rerunning it resumes where it stopped) and sleeps between batches to stay under --max-rate documents per
+# second on a live database. Until it has finished, date-range reads only see converted documents.
+
+# Fields converted per collection; client_dates are the ones sent back as the client wrote them
+TYPED_FIELDS = {
+    "transactions": {"dates": ("date", "createdAt", "updatedAt"), "decimals": ("amount",), "client_dates": ("date",)},
+    "goals": {"dates": ("deadline", "createdAt", "updatedAt"), "decimals": (), "client_dates": ("deadline",)},
+    "budgets": {"dates": ("createdAt", "updatedAt"), "decimals": (), "client_dates": ()},
+    "predictions": {"dates": ("createdAt", "updatedAt", "generatedAt"), "decimals": (), "client_dates": ()},
+}
+DATE_FORMATS = "dateFormats"
+# Bookkeeping fields kept off list and item responses; /sync reports the seq on each entry
+INTERNAL_FIELDS = ("syncSeq", "syncAt")
+BACKFILL_BATCH_SIZE = 500
+BACKFILL_MAX_RATE = 2000  # Documents per second
+CHECKPOINTS = "migrations"
+# _id types the backfill walks, in MongoDB's sort order
+ID_TYPES = ("number", "string", "object", "binData", "objectId", "bool", "date")
+
+
+def parse_datetime(value):
+    # ISO-8601 date or date-time, with or without an offset -> naive datetime.
+    # Values with an offset are converted to UTC; values without one are kept as they are.
+    if isinstance(value, datetime):
+        moment = value
+    elif isinstance(value, str):
+        try:
+            moment = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError(f"Invalid date: {value!r}")
+    else:
+        raise ValueError(f"Invalid date: {value!r}")
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def date_format(value):
+    # The form a client wrote a date in: "date", "local" or "utc" (see above)
+    if isinstance(value, datetime):
+        return "local" if value.tzinfo is None else "utc"
+    text = value.strip()
+    if len(text) == 10:
+        return "date"
+    return "local" if datetime.fromisoformat(text.replace("Z", "+00:00")).tzinfo is None else "utc"
+
+
+def parse_client_date(value):
+    # Returns (naive datetime, the form it was written in)
+    moment = parse_datetime(value)
+    return moment, date_format(value)
+
+
+def to_wire(document):
+    # Puts the client's dates back in the form it wrote them, in place. Pops dateFormats and the
+    # sync bookkeeping, which clients never see; dates without a recorded form are left to
+    # serialize.py (UTC, with Z).
+    for field in INTERNAL_FIELDS:
+        document.pop(field, None)
+    formats = document.pop(DATE_FORMATS, None)
+    if formats:
+        for field, form in formats.items():
+            value = document.get(field)
+            if isinstance(value, datetime):
+                if form == "date":
+                    document[field] = value.date().isoformat()
+                elif form == "local":
+                    # BSON dates keep milliseconds
+                    document[field] = value.isoformat(timespec="milliseconds" if value.microsecond else "seconds")
+    return document
+
+
+def to_decimal(value):
+    # Number, numeric string or Decimal128 -> Decimal. Floats go through their shortest
+    # repr, so 10.1 becomes Decimal("10.1") rather than its binary expansion.
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    if isinstance(value, bool) or not isinstance(value, (int, float, str, Decimal)):
+        raise ValueError(f"Invalid amount: {value!r}")
+    try:
+        amount = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {value!r}")
+    if not amount.is_finite():
+        raise ValueError(f"Invalid amount: {value!r}")
+    return amount
+
+
+def to_decimal128(value):
+    return Decimal128(to_decimal(value))
+
+
+def to_float(value):
+    # For arithmetic on values read back, which may be Decimal128, double or missing
+    if value is None:
+        return None
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    return float(value)
+
+
+def converted(document, fields):
+    # The $set that types one document's legacy values; None when it needs nothing
+    changes = {}
+    for field in fields["dates"]:
+        if isinstance(document.get(field), str):
+            try:
+                changes[field] = parse_datetime(document[field])
+                if field in fields["client_dates"]:
+                    changes[f"{DATE_FORMATS}.{field}"] = date_format(document[field])
+            except ValueError:
+                pass
+    for field in fields["decimals"]:
+        value = document.get(field)
+        if value is not None and not isinstance(value, Decimal128):
+            try:
+                changes[field] = to_decimal128(value)
+            except ValueError:
+                pass
+    return changes or None
+
+
+def backfill(db, collection_name, batch_size=BACKFILL_BATCH_SIZE, max_rate=BACKFILL_MAX_RATE, restart=False, log=print):
+    fields = TYPED_FIELDS[collection_name]
+    collection = db[collection_name]
+    checkpoints = db[CHECKPOINTS]
+    checkpoint_id = f"typed-storage:{collection_name}"
+    if restart:
+        checkpoints.delete_one({"_id": checkpoint_id})
+    checkpoint = checkpoints.find_one({"_id": checkpoint_id}) or {"scanned": 0, "converted": 0}
+    if checkpoint.get("done"):
+        log(f"{collection_name}: already done ({checkpoint['converted']} converted)")
+        return checkpoint["converted"]
+
+    projection = {field: 1 for field in fields["dates"] + fields["decimals"]}
+    id_type = checkpoint.get("idType", ID_TYPES[0])
+    last_id = checkpoint.get("lastId")
+    while True:
+        started = time.monotonic()
+        # $gt only compares _ids of one type, so each type is its own range
+        query = {"_id": {"$type": id_type, **({"$gt": last_id} if last_id is not None else {})}}
+        batch = list(collection.find(query, projection).sort("_id", 1).limit(batch_size))
+        if not batch:
+            if id_type == ID_TYPES[-1]:
+                break
+            id_type, last_id = ID_TYPES[ID_TYPES.index(id_type) + 1], None
+            continue
+
+        operations = []
+        for document in batch:
+            changes = converted(document, fields)
+            if changes:
+                # Matching the old values skips documents a live write has changed since we read them
+                current = {field: document.get(field) for field in changes if field in fields["dates"] + fields["decimals"]}
+                operations.append(UpdateOne({"_id": document["_id"], **current}, {"$set": changes}))
+        if operations:
+            checkpoint["converted"] += collection.bulk_write(operations, ordered=False).modified_count
+
+        last_id = batch[-1]["_id"]
+        checkpoint["scanned"] += len(batch)
+        checkpoints.update_one(
+            {"_id": checkpoint_id},
+            {"$set": {"idType": id_type, "lastId": last_id, "scanned": checkpoint["scanned"],
+                      "converted": checkpoint["converted"], "updatedAt": datetime.utcnow()}},
+            upsert=True
+        )
+        log(f"{collection_name}: {checkpoint['scanned']} scanned, {checkpoint['converted']} converted")
+
+        # Throttle to max_rate documents per second
+        pause = len(batch) / max_rate - (time.monotonic() - started) if max_rate else 0
+        if pause > 0:
+            time.sleep(pause)
+
+    checkpoints.update_one({"_id": checkpoint_id}, {"$set": {"done": True, "updatedAt": datetime.utcnow()}}, upsert=True)
+    return checkpoint["converted"]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert legacy string dates and float amounts to BSON types")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = subcommands.add_parser("backfill", help="Convert existing documents in place")
+    backfill_parser.add_argument("--collection", choices=sorted(TYPED_FIELDS), action="append",
+                                 help="Only this collection (repeatable; default all)")
+    backfill_parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    backfill_parser.add_argument("--max-rate", type=int, default=BACKFILL_MAX_RATE,
+                                 help="Documents per second, 0 for no limit")
+    backfill_parser.add_argument("--restart", action="store_true", help="Ignore saved progress and start over")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/")
+    args = parser.parse_args()
+
+    db = MongoClient(args.uri)["finace_app"]
+    if args.command == "backfill":
+        for name in args.collection or sorted(TYPED_FIELDS):
+            backfill(db, name, args.batch_size, args.max_rate, args.restart)
@@ -0,0 +1,171 @@
+import argparse
+from datetime import datetime, timedelta
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from changes import counter_id
+from storage import to_wire
+
+# Delta sync feed for the mobile client. Every user has one change sequence across all
+# synced collections, kept in change_counters; each write stamps the document it touches
+# with the next value in "syncSeq", and each delete leaves a tombstone stamped the same way.
+# A client remembers the highest sequence it has seen and asks for everything after it:
+#
+#     GET /sync?user_id=...&since=<seq>
+#
+# which is one (userId, syncSeq) index range per collection, however long the history is.
+#
+# Sequence numbers are reserved just before a write is applied, so two writes for the same
+# user that race can become visible out of order. The feed therefore only moves a client's
+# cursor past changes older than SYNC_SETTLE_SECONDS; newer ones are sent but sent again next
+# time, which gives a late write with a lower sequence time to land. Applying a change twice
+# is harmless (upserts and deletes by id).
+#
+# Tombstones expire TOMBSTONE_TTL_DAYS after the delete (a TTL index in indexes.py), so a
+# client that stays offline longer could miss deletes. Each user's sync counter keeps the
+# highest tombstone sequence written per day; a client whose cursor is below the highest one
+# from a day that may have expired is told to start over from since=0 (410, "resync": true).
+
+SYNC_COLLECTIONS = ("transactions", "budgets", "goals", "predictions")
+TOMBSTONES = "sync_tombstones"
+SYNC_PAGE_SIZE = 500
+MAX_SYNC_PAGE_SIZE = 2000
+SYNC_SETTLE_SECONDS = 5
+TOMBSTONE_TTL_DAYS = 180  # Longer than any client is expected to stay offline and still catch up
+TOMBSTONE_TTL_SECONDS = TOMBSTONE_TTL_DAYS * 24 * 3600
+
+
+def reserve(counters, user_id, count=1):
+    # Returns the first of count consecutive sequence numbers for the user
+    counter = counters.find_one_and_update(
+        {"_id": counter_id("sync", user_id)},
+        {"$inc": {"seq": count}},
+        {"seq": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["seq"] - count + 1
+
+
+def stamp_new(counters, documents):
+    # Sets syncSeq/syncAt on documents about to be inserted, one reservation per user
+    now = datetime.utcnow()
+    by_user = {}
+    for document in documents:
+        if document.get("userId") is not None:
+            by_user.setdefault(document["userId"], []).append(document)
+    for user_id, owned in by_user.items():
+        first = reserve(counters, user_id, len(owned))
+        for offset, document in enumerate(owned):
+            document["syncSeq"] = first + offset
+            document["syncAt"] = now
+
+
+def stamp_updated(collection, counters, tombstones, document_id, previous_user_id, user_id):
+    # Called after an update. $max keeps the stamp rising if two updates of one document race,
+    # except when it changed owner: then it starts over in the new owner's sequence.
+    moved = previous_user_id != user_id
+    if user_id is not None:
+        seq = reserve(counters, user_id)
+        collection.update_one(
+            {"_id": document_id},
+            {"$set": {"syncSeq": seq, "syncAt": datetime.utcnow()}} if moved
+            else {"$max": {"syncSeq": seq}, "$set": {"syncAt": datetime.utcnow()}}
+        )
+    if moved:
+        # Moved to another user: it's gone from the previous owner's point of view
+        record_deleted(tombstones, counters, collection.name, [(document_id, previous_user_id)])
+
+
+def record_deleted(tombstones, counters, collection_name, deleted):
+    # deleted: (document _id, userId) pairs
+    now = datetime.utcnow()
+    documents = [
+        {"userId": user_id, "collection": collection_name, "documentId": document_id, "deletedAt": now}
+        for document_id, user_id in deleted if user_id is not None
+    ]
+    stamp_new(counters, documents)
+    if documents:
+        tombstones.insert_many(documents)
+    # Note the day's highest tombstone sequence per user, for expired_through()
+    latest = {}
+    for document in documents:
+        latest[document["userId"]] = max(latest.get(document["userId"], 0), document["syncSeq"])
+    for user_id, seq in latest.items():
+        counters.update_one(
+            {"_id": counter_id("sync", user_id)},
+            {"$max": {f"tombstoneDays.{now.strftime('%Y-%m-%d')}": seq}}
+        )
+
+
+def expired_through(counters, user_id, now=None):
+    # The highest sequence of the user's tombstones that the TTL index may already have removed;
+    # a client whose cursor is below it may have missed deletes. 0 when none can have expired.
+    counter = counters.find_one({"_id": counter_id("sync", user_id)}, {"tombstoneDays": 1}) or {}
+    cutoff = ((now or datetime.utcnow()) - timedelta(days=TOMBSTONE_TTL_DAYS)).strftime("%Y-%m-%d")
+    return max((seq for day, seq in counter.get("tombstoneDays", {}).items() if day <= cutoff), default=0)
+
+
+def changed_since(collection, user_id, since, limit):
+    # One page of a collection's changes in sequence order, plus one to tell whether more follow
+    return list(collection.find({"userId": user_id, "syncSeq": {"$gt": since}}).sort("syncSeq", 1).limit(limit + 1))
+
+
+def merge(pages, tombstones, since, limit, now=None):
+    # pages: {collection name: changed_since(...)}. Sequence numbers are unique per user across
+    # collections, so the first `limit` of the merged pages are the next `limit` changes overall.
+    # Returns (changes, next_since, has_more).
+    entries = [
+        (document["syncSeq"], document.pop("syncAt", None), {
+            "seq": document["syncSeq"], "collection": name, "op": "upsert",
+            "id": str(document["_id"]), "document": to_wire(document)
+        })
+        for name, page in pages.items() for document in page
+    ]
+    entries += [
+        (tombstone["syncSeq"], tombstone.get("syncAt"), {
+            "seq": tombstone["syncSeq"], "collection": tombstone["collection"], "op": "delete",
+            "id": str(tombstone["documentId"])
+        })
+        for tombstone in tombstones
+    ]
+    entries.sort(key=lambda entry: entry[0])
+    page = entries[:limit]
+
+    settled_before = (now or datetime.utcnow()) - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    next_since = since
+    for seq, stamped_at, _ in page:
+        if stamped_at is not None and stamped_at > settled_before:
+            # Too recent to be sure no lower sequence is still in flight: resend from here next time
+            return [entry for _, _, entry in page], next_since, False
+        next_since = seq
+    return [entry for _, _, entry in page], next_since, len(entries) > limit
+
+
+def backfill(db, user_id=None):
+    # Stamps documents written before the feed existed, so a first sync from 0 includes them
+    query = {"syncSeq": {"$exists": False}, "userId": user_id if user_id else {"$ne": None}}
+    stamped = 0
+    for name in SYNC_COLLECTIONS:
+        collection = db[name]
+        for owner in collection.distinct("userId", query):
+            ids = [document["_id"] for document in collection.find({**query, "userId": owner}, {"_id": 1})]
+            first = reserve(db["change_counters"], owner, len(ids))
+            operations = [
+                UpdateOne({"_id": document_id, "syncSeq": {"$exists": False}}, {"$set": {"syncSeq": first + offset}})
+                for offset, document_id in enumerate(ids)
+            ]
+            if operations:
+                stamped += collection.bulk_write(operations, ordered=False).modified_count
+    return stamped
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Maintain the delta sync feed")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = subcommands.add_parser("backfill", help="Stamp documents that have no sync sequence yet")
+    backfill_parser.add_argument("--user-id", help="Only stamp this user's documents")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/")
+    args = parser.parse_args()
+
+    db = MongoClient(args.uri)["finace_app"]
+    if args.command == "backfill":
+        print(f"Stamped {backfill(db, args.user_id)} documents.")
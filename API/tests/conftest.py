@@ -0,0 +1,27 @@
+import os
+import sys
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [API_DIR, os.path.join(os.path.dirname(API_DIR), "data")]
+
+# Most tests are pure functions. Tests that need a MongoDB server use SPENDIO_TEST_MONGO_URI (default: a local mongod)
+# and a throwaway database, and are skipped when no server answers.
+TEST_MONGO_URI = os.environ.get("SPENDIO_TEST_MONGO_URI", "mongodb://localhost:27017/")
+TEST_DB = "finace_app_test"
+
+
+@pytest.fixture
+def db():
+    client = MongoClient(TEST_MONGO_URI, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        client.close()
+        pytest.skip(f"no MongoDB server at {TEST_MONGO_URI}")
+    client.drop_database(TEST_DB)
+    yield client[TEST_DB]
+    client.drop_database(TEST_DB)
+    client.close()
@@ -0,0 +1,38 @@
+import numpy as np
+import forecast
+
+FIRST_MONTH = forecast.month_index("2022-10")
+
+
+def test_build_series_groups_rows_and_drops_months_outside_the_window():
+    rows = [("u1", "Food", "LKR", "2022-10", 10.0), ("u1", "Food", "LKR", "2022-12", 30.0),
+            ("u2", "Rent", "USD", "2022-11", 5.0), ("u1", "Food", "LKR", "2022-09", 99.0),
+            ("u1", "Food", "LKR", "2023-01", 99.0)]
+    keys, series = forecast.build_series(rows, FIRST_MONTH, 3)
+    assert keys == [("u1", "Food", "LKR"), ("u2", "Rent", "USD")]
+    assert series.tolist() == [[10.0, 0.0, 30.0], [0.0, 5.0, 0.0]]
+
+
+def test_flat_and_late_starting_series_forecast_their_level():
+    series = np.array([[100.0] * 24, [0.0] * 18 + [50.0] * 6, [0.0] * 23 + [70.0], [0.0] * 24])
+    horizon = forecast.forecast(series, FIRST_MONTH)
+    assert horizon.shape == (4, forecast.SEASON_LENGTH)
+    assert np.allclose(horizon, [[100.0], [50.0], [70.0], [0.0]])
+
+
+def test_steady_growth_is_a_trend_not_a_season():
+    series = np.array([[10.0 * month for month in range(1, 25)]])
+    assert np.allclose(forecast.forecast(series, FIRST_MONTH)[0, :3], [250.0, 260.0, 270.0], atol=0.1)
+
+
+def test_yearly_peak_is_forecast_in_its_month():
+    first_month = forecast.month_index("2021-10")
+    series = np.array([[300.0 if (first_month + column) % 12 == 11 else 100.0 for column in range(36)]])
+    horizon = forecast.forecast(series, first_month)[0]
+    # The horizon starts in 2024-10, so December is its third month
+    assert abs(horizon[2] - 300.0) < 1 and np.allclose(np.delete(horizon, 2), 100.0, atol=1)
+
+
+def test_shrinking_series_is_floored_at_zero():
+    series = np.array([[100.0 - 8 * month for month in range(12)]])
+    assert (forecast.forecast(series, FIRST_MONTH) >= 0).all()
@@ -0,0 +1,46 @@
+from datetime import date
+import numpy as np
+import pytest
+import fx
+
+DAY = date(2024, 5, 1).toordinal()
+TABLE = fx.RateTable([(DAY, "USD", 300.0), (DAY + 3, "USD", 310.0), (DAY + 10, "USD", 330.0), (DAY, "EUR", 320.0)])
+
+
+def test_rates_use_the_latest_row_on_or_before_each_day():
+    rates = TABLE.rates(["USD", "USD", "USD", "USD", fx.BASE_CURRENCY, "GBP"], [DAY - 5, DAY + 2, DAY + 3, DAY + 40, DAY, DAY])
+    assert rates[:5].tolist() == [300.0, 300.0, 310.0, 330.0, 1.0]
+    assert np.isnan(rates[5])
+
+
+@pytest.mark.parametrize("start, end", [(0, 1), (0, 3), (1, 12), (-4, 2), (2, 30), (12, 15), (5, 5)])
+def test_average_rates_match_the_mean_of_daily_rates(start, end):
+    days = range(DAY + start, max(DAY + end, DAY + start + 1))
+    expected = TABLE.rates(["USD"] * len(days), list(days)).mean()
+    assert TABLE.average_rates(["USD"], [DAY + start], [DAY + end])[0] == pytest.approx(expected)
+
+
+def test_convert_goes_through_the_base_currency():
+    converted = TABLE.convert([10.0, 3200.0, 5.0, 7.0], ["USD", fx.BASE_CURRENCY, "GBP", "GBP"], [DAY] * 4,
+                              ["EUR", "EUR", "EUR", "GBP"])
+    assert converted[:2].tolist() == pytest.approx([9.375, 10.0])
+    # Unknown currencies convert to NaN, except into themselves
+    assert np.isnan(converted[2]) and converted[3] == 7.0
+
+
+def test_require_rejects_currencies_without_rates():
+    assert TABLE.require("EUR") == "EUR"
+    with pytest.raises(fx.UnknownCurrency):
+        TABLE.require("GBP")
+
+
+def test_load_reads_the_rates_csv_and_reports_bad_lines(tmp_path):
+    path = tmp_path / "rates.csv"
+    path.write_text("date,currency,rate\n2024-05-01, usd ,300\n2024-05-04,USD,310\n")
+    table = fx.RateTable.load(str(path))
+    assert table.rates(["USD"], [DAY + 5]).tolist() == [310.0]
+    assert table.version
+
+    path.write_text("date,currency,rate\n2024-05-01,USD,300\n2024-05-02,USD,-1\n")
+    with pytest.raises(ValueError, match="line 3"):
+        fx.RateTable.load(str(path))
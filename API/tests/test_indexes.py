@@ -0,0 +1,12 @@
+import indexes
+
+
+def test_ensure_indexes_is_idempotent(db):
+    first = indexes.ensure_indexes(db)
+    assert indexes.ensure_indexes(db) == first
+
+
+def test_no_route_query_scans_a_collection_or_sorts_in_memory(db):
+    indexes.ensure_indexes(db)
+    assert indexes.unindexed_queries(db) == []
+
@@ -0,0 +1,40 @@
+import io
+import json
+import pytest
+import mongo_import
+
+
+def parse(text, chunk_size=None, monkeypatch=None):
+    if chunk_size:
+        monkeypatch.setattr(mongo_import, "READ_CHUNK_SIZE", chunk_size)
+    return list(mongo_import.iter_json_values(io.StringIO(text)))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, None])
+def test_array_parses_the_same_at_any_chunk_size(chunk_size, monkeypatch):
+    text = '[ {"amount": 123456, "note": "a, b"},\n 42 , "x", [1, 2], {} ]'
+    assert parse(text, chunk_size, monkeypatch) == [{"amount": 123456, "note": "a, b"}, 42, "x", [1, 2], {}]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3])
+def test_number_split_across_chunks_is_read_whole(chunk_size, monkeypatch):
+    assert parse("123456", chunk_size, monkeypatch) == [123456]
+    assert parse("[123456]", chunk_size, monkeypatch) == [123456]
+
+
+def test_concatenated_documents_and_empty_array():
+    assert parse('{"a": 1} {"b": 2}\n{"c": 3}') == [{"a": 1}, {"b": 2}, {"c": 3}]
+    assert parse("[]") == []
+    assert parse("  [ ]  ") == []
+
+
+@pytest.mark.parametrize("text", ['[{"a": 1} {"b": 2}]', "[1 2]", "[1,, 2]", "[1, 2", '[{"a": 1},'])
+def test_malformed_arrays_are_rejected(text):
+    with pytest.raises(json.JSONDecodeError):
+        parse(text)
+
+
+def test_record_ids_follow_file_and_position():
+    assert mongo_import.record_id("transactions", 1) == mongo_import.record_id("transactions", 1)
+    assert mongo_import.record_id("transactions", 1) != mongo_import.record_id("transactions", 2)
+    assert mongo_import.record_id("transactions", 1) != mongo_import.record_id("budgets", 1)
@@ -0,0 +1,34 @@
+from datetime import datetime
+import pytest
+from bson.objectid import ObjectId
+import pagination
+
+SORT = [("date", -1), ("_id", -1)]
+
+
+def test_cursor_round_trips_dates_and_object_ids():
+    document = {"_id": ObjectId(), "date": datetime(2024, 5, 1, 18, 30, 0, 123000), "amount": 5}
+    assert pagination.decode_cursor(pagination.encode_cursor(document, SORT), SORT) == [document["date"], document["_id"]]
+
+
+@pytest.mark.parametrize("token", ["not base64!", "bm90IGpzb24=", pagination.encode_cursor({"_id": "x", "date": None}, SORT),
+                                   pagination.encode_cursor({"_id": ObjectId()}, [("_id", 1)])])
+def test_bad_cursors_are_rejected(token):
+    with pytest.raises(pagination.InvalidCursor):
+        pagination.decode_cursor(token, SORT)
+
+
+def test_keyset_filter_follows_each_sort_direction():
+    after = datetime(2024, 5, 1)
+    last_id = ObjectId()
+    assert pagination.keyset_filter(SORT, [after, last_id]) == {"$or": [
+        {"date": {"$lt": after}},
+        {"date": after, "_id": {"$lt": last_id}}
+    ]}
+    assert pagination.keyset_filter([("_id", 1)], [last_id]) == {"$or": [{"_id": {"$gt": last_id}}]}
+
+
+def test_projection_keeps_sort_keys_and_drops_hidden_fields():
+    assert pagination.projection_for(None, SORT) is None
+    assert pagination.projection_for(None, SORT, ("password",)) == {"password": 0}
+    assert pagination.projection_for("amount, password", SORT, ("password",)) == {"amount": 1, "date": 1, "_id": 1}
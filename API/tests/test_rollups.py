@@ -0,0 +1,56 @@
+from datetime import datetime
+from bson.decimal128 import Decimal128
+import rollups
+
+
+class Calls:
+    # Records the writes move() makes; bucket lookups find nothing, so remove() stops after its $inc
+    def __init__(self):
+        self.calls = []
+
+    def update_one(self, key, update, upsert=False):
+        self.calls.append(("update_one", key, update))
+
+    def find_one_and_update(self, key, update, return_document=None):
+        self.calls.append(("find_one_and_update", key, update))
+        return None
+
+
+def transaction(**fields):
+    return {"userId": "u1", "category": "Food", "date": datetime(2024, 5, 31, 23, 59), "amount": Decimal128("12.50"),
+            "currency": "LKR", "type": "Expense", **fields}
+
+
+def test_bucket_key_reads_typed_and_legacy_dates():
+    assert rollups.bucket_key(transaction()) == {"userId": "u1", "category": "Food", "month": "2024-05", "currency": "LKR"}
+    assert rollups.bucket_key(transaction(date="2024-05-01T10:00:00Z"))["month"] == "2024-05"
+    assert rollups.bucket_key(transaction(currency=None))["currency"] == rollups.BASE_CURRENCY
+
+
+def test_month_range_covers_the_whole_month():
+    assert rollups.month_range("2024-02") == {"$gte": datetime(2024, 2, 1), "$lt": datetime(2024, 3, 1)}
+    assert rollups.month_range("2024-12") == {"$gte": datetime(2024, 12, 1), "$lt": datetime(2025, 1, 1)}
+
+
+def test_move_without_a_bucket_change_writes_nothing():
+    calls = Calls()
+    rollups.move(calls, None, transaction(), transaction(amount=12.5, note="edited"))
+    assert calls.calls == []
+
+
+def test_move_to_another_month_takes_the_amount_out_of_the_old_bucket():
+    calls = Calls()
+    rollups.move(calls, None, transaction(), transaction(date=datetime(2024, 6, 1)))
+    (_, old_key, removed), (_, new_key, added) = calls.calls
+    assert old_key["month"] == "2024-05" and removed == {"$inc": {"sum": -12.5, "count": -1}}
+    assert new_key["month"] == "2024-06" and added["$inc"] == {"sum": 12.5, "count": 1}
+
+
+def test_move_to_or_from_income_only_touches_spending():
+    calls = Calls()
+    rollups.move(calls, None, transaction(), transaction(type="Income"))
+    assert [name for name, _, _ in calls.calls] == ["find_one_and_update"]
+
+    calls = Calls()
+    rollups.move(calls, None, transaction(type="Income"), transaction())
+    assert [name for name, _, _ in calls.calls] == ["update_one"]
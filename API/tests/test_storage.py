@@ -0,0 +1,53 @@
+from datetime import datetime
+from decimal import Decimal
+import pytest
+from bson.decimal128 import Decimal128
+import storage
+
+
+@pytest.mark.parametrize("value, moment, form", [
+    ("2025-12-31", datetime(2025, 12, 31), "date"),
+    ("2024-05-01T18:30:00.123", datetime(2024, 5, 1, 18, 30, 0, 123000), "local"),
+    ("2024-05-01T13:00:00Z", datetime(2024, 5, 1, 13, 0), "utc"),
+    ("2024-05-01T18:30:00+05:30", datetime(2024, 5, 1, 13, 0), "utc"),
+])
+def test_parse_client_date_keeps_the_form_it_was_written_in(value, moment, form):
+    assert storage.parse_client_date(value) == (moment, form)
+
+
+@pytest.mark.parametrize("value", ["yesterday", "2024-13-01", 20240501, None])
+def test_parse_client_date_rejects_non_dates(value):
+    with pytest.raises(ValueError):
+        storage.parse_client_date(value)
+
+
+@pytest.mark.parametrize("value", ["2025-12-31", "2024-05-01T18:30:00.123", "2024-05-01T18:30:00"])
+def test_to_wire_sends_dates_back_as_written(value):
+    moment, form = storage.parse_client_date(value)
+    document = {"date": moment, "createdAt": moment, "dateFormats": {"date": form}, "syncSeq": 3, "syncAt": moment}
+    assert storage.to_wire(document) == {"date": value, "createdAt": moment}
+
+
+def test_to_wire_leaves_utc_and_unrecorded_dates_to_the_serializer():
+    moment = datetime(2024, 5, 1, 13, 0)
+    assert storage.to_wire({"date": moment, "dateFormats": {"date": "utc"}}) == {"date": moment}
+    assert storage.to_wire({"date": "2024-05-01"}) == {"date": "2024-05-01"}
+
+
+def test_amounts_are_exact_decimals():
+    assert storage.to_decimal(10.1) == Decimal("10.1")
+    assert storage.to_decimal128(" 12.50 ") == Decimal128("12.50")
+    assert storage.to_float(Decimal128("0.1")) == 0.1
+    for value in ("abc", "NaN", True, None):
+        with pytest.raises(ValueError):
+            storage.to_decimal(value)
+
+
+def test_converted_types_legacy_values_only():
+    fields = storage.TYPED_FIELDS["transactions"]
+    legacy = {"date": "2024-05-01", "createdAt": "2024-05-01T10:00:00Z", "amount": 5.5}
+    assert storage.converted(legacy, fields) == {
+        "date": datetime(2024, 5, 1), "dateFormats.date": "date",
+        "createdAt": datetime(2024, 5, 1, 10, 0), "amount": Decimal128("5.5")
+    }
+    assert storage.converted({"date": datetime(2024, 5, 1), "amount": Decimal128("5.5")}, fields) is None
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+import sync
+
+NOW = datetime(2024, 5, 1, 12, 0, 0)
+SETTLED = NOW - timedelta(minutes=1)
+
+
+class Counters:
+    # A change_counters collection holding one user's sync counter
+    def __init__(self, counter):
+        self.counter = counter
+
+    def find_one(self, query, projection=None):
+        return self.counter
+
+
+def document(seq, stamped_at=SETTLED, **fields):
+    return {"_id": ObjectId(), "userId": "u1", "syncSeq": seq, "syncAt": stamped_at, **fields}
+
+
+def tombstone(seq, stamped_at=SETTLED, collection="budgets"):
+    return {"_id": ObjectId(), "userId": "u1", "syncSeq": seq, "syncAt": stamped_at,
+            "collection": collection, "documentId": ObjectId()}
+
+
+def test_merge_interleaves_collections_and_deletes_in_sequence_order():
+    pages = {"transactions": [document(1), document(4)], "goals": [document(2)]}
+    changes, next_since, has_more = sync.merge(pages, [tombstone(3)], 0, 10, now=NOW)
+    assert [(change["seq"], change["collection"], change["op"]) for change in changes] == [
+        (1, "transactions", "upsert"), (2, "goals", "upsert"), (3, "budgets", "delete"), (4, "transactions", "upsert")
+    ]
+    assert (next_since, has_more) == (4, False)
+
+
+def test_merge_stops_at_the_limit_and_reports_more():
+    pages = {"transactions": [document(6), document(8), document(9)], "budgets": [document(7)]}
+    changes, next_since, has_more = sync.merge(pages, [], 5, 2, now=NOW)
+    assert [change["seq"] for change in changes] == [6, 7]
+    assert (next_since, has_more) == (7, True)
+
+
+def test_merge_holds_the_cursor_before_unsettled_changes():
+    recent = NOW - timedelta(seconds=sync.SYNC_SETTLE_SECONDS - 1)
+    pages = {"transactions": [document(1), document(2, recent), document(3)]}
+    changes, next_since, has_more = sync.merge(pages, [], 0, 2, now=NOW)
+    # The recent change is sent, but the next request starts before it so a late lower sequence isn't skipped
+    assert [change["seq"] for change in changes] == [1, 2]
+    assert (next_since, has_more) == (1, False)
+
+
+def test_merge_sends_documents_without_bookkeeping():
+    stored = document(1, None, date=datetime(2024, 4, 30), dateFormats={"date": "date"})
+    (change,), next_since, _ = sync.merge({"transactions": [stored]}, [], 0, 10, now=NOW)
+    assert change["id"] == str(stored["_id"])
+    assert change["document"] == {"_id": stored["_id"], "userId": "u1", "date": "2024-04-30"}
+    assert next_since == 1
+
+
+def test_expired_through_is_the_highest_sequence_past_the_ttl():
+    cutoff = NOW - timedelta(days=sync.TOMBSTONE_TTL_DAYS)
+    days = {(cutoff - timedelta(days=2)).strftime("%Y-%m-%d"): 10, cutoff.strftime("%Y-%m-%d"): 12,
+            (cutoff + timedelta(days=1)).strftime("%Y-%m-%d"): 20}
+    assert sync.expired_through(Counters({"tombstoneDays": days}), "u1", now=NOW) == 12
+    assert sync.expired_through(Counters(None), "u1", now=NOW) == 0
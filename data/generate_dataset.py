@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+
+# Writes a synthetic dataset of N users x M transactions, plus budgets, goals and
+# predictions, as files mongo_import.py loads (one file per collection). The same --seed
+# and --end always produce the same data (password salts aside), so runs are comparable.
+#
+# Documents follow the shapes the API writes: users get ObjectId _ids and every other
+# collection refers to them by the hex string in userId, so load with
+#
+#     python data/mongo_import.py data/generated --coerce-fields _id
+
+# (category, median amount in LKR, share of transactions)
+CATEGORIES = [
+    ("Food", 900, 0.35),
+    ("Transport", 450, 0.2),
+    ("Groceries", 3500, 0.15),
+    ("Clothes", 6000, 0.05),
+    ("Rent", 45000, 0.03),
+    ("Entertainment", 2500, 0.07),
+    ("Other", 1500, 0.15),
+]
+NOTES = ["", "", "Lunch", "Taxi", "Supermarket", "Bus fare", "Dinner out", "Movie", "Pharmacy", "Gift"]
+GOAL_TITLES = ["Emergency Fund", "Buy a Car", "Vacation", "New Laptop", "Home Deposit", "Retirement"]
+PASSWORD = "password"  # Every generated user logs in with this
+
+
+def iso(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def write_array(path, documents):
+    with open(path, "w") as f:
+        json.dump(documents, f)
+
+
+def generate(out_dir, users, transactions_per_user, months=24, seed=42, end=None):
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    now = end or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    span_seconds = int(timedelta(days=30 * months).total_seconds())
+    names, medians, weights = zip(*CATEGORIES)
+    password_hash = generate_password_hash(PASSWORD)
+
+    # ObjectId-shaped hex ids: a 4-byte timestamp followed by 8 seeded random bytes
+    user_ids = [f"{int(now.timestamp()) - i:08x}{rng.getrandbits(64):016x}" for i in range(users)]
+    write_array(os.path.join(out_dir, "users.json"), [
+        {
+            "_id": user_id,
+            "name": f"User {i}",
+            "email": f"user{i}@example.com",
+            "password": password_hash,
+            "createdAt": iso(now - timedelta(days=30 * months + i % 30))
+        }
+        for i, user_id in enumerate(user_ids)
+    ])
+
+    # Transactions are streamed out as NDJSON, so memory stays flat for any N x M
+    with open(os.path.join(out_dir, "transactions.ndjson"), "w") as f:
+        for user_id in user_ids:
+            for _ in range(transactions_per_user):
+                index = rng.choices(range(len(names)), weights)[0]
+                moment = now - timedelta(seconds=rng.randrange(span_seconds))
+                income = rng.random() < 0.03
+                f.write(json.dumps({
+                    "date": iso(moment),
+                    "userId": user_id,
+                    "category": "Salary" if income else names[index],
+                    "amount": round(rng.lognormvariate(0, 0.6) * (150000 if income else medians[index]), 2),
+                    "currency": "LKR",
+                    "note": rng.choice(NOTES),
+                    "type": "Income" if income else "Expense",
+                    "createdAt": iso(moment),
+                    "updatedAt": iso(moment)
+                }) + "\n")
+
+    budgets, goals, predictions = [], [], []
+    for user_id in user_ids:
+        for name, median, _ in CATEGORIES:
+            if rng.random() < 0.6:
+                budgets.append({
+                    "userId": user_id,
+                    "category": name,
+                    "limit": round(median * rng.uniform(15, 40), -2),
+                    "currency": "LKR",
+                    "createdAt": iso(now),
+                    "updatedAt": iso(now)
+                })
+            predictions.append({
+                "userId": user_id,
+                "category": name,
+                "predicted_amount": round(median * rng.uniform(10, 30), 2),
+                "currency": "LKR",
+                "createdAt": iso(now),
+                "updatedAt": iso(now)
+            })
+        for title in rng.sample(GOAL_TITLES, rng.randint(1, 4)):
+            target = round(rng.uniform(50000, 2000000), -3)
+            goals.append({
+                "userId": user_id,
+                "title": title,
+                "targetAmount": target,
+                "currentAmount": round(target * rng.random(), -2),
+                "deadline": iso(now + timedelta(days=rng.randint(30, 1500))),
+                "description": "",
+                "priority": rng.choice(["Low", "Medium", "High"]),
+                "category": "General",
+                "notifyOnProgress": False,
+                "currency": "LKR",
+                "createdAt": iso(now),
+                "updatedAt": iso(now)
+            })
+
+    write_array(os.path.join(out_dir, "budgets.json"), budgets)
+    write_array(os.path.join(out_dir, "goals.json"), goals)
+    write_array(os.path.join(out_dir, "predictions.json"), predictions)
+    return user_ids
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset for load tests")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--transactions", type=int, default=1000, help="Transactions per user")
+    parser.add_argument("--months", type=int, default=24, help="History length")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end", type=datetime.fromisoformat, help="Date the history ends (default: today)")
+    parser.add_argument("--out", default=os.path.join("data", "generated"))
+    args = parser.parse_args()
+
+    generate(args.out, args.users, args.transactions, args.months, args.seed, args.end)
+    print(f"Wrote {args.users} users x {args.transactions} transactions to {args.out}")
@@ -1,77 +1,196 @@
-import os
+import argparse
+import hashlib
 import json
-from pymongo import MongoClient
-from bson.objectid import ObjectId  # Import ObjectId
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+from bson.objectid import ObjectId
+
+# Loads every .json/.ndjson/.jsonl file in a directory into the collection named after the file.
+# Files are parsed incrementally and written in fixed-size bulk_write batches, and collections are
+# loaded concurrently. Documents are inserted only when their _id isn't there yet, so re-runs are
+# idempotent and never overwrite what the API has since written to a document (sync stamps, typed
+# dates and amounts). Records without an _id get one derived from the file and their position in
+# it, so a re-run of the same file finds them again and identical records still load separately.
+
+READ_CHUNK_SIZE = 1 << 20  # Bytes read from disk at a time
+ID_FIELDS = ("_id", "userId")
+decoder = json.JSONDecoder()
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class Stats:
+    def __init__(self, collection_name):
+        self.collection_name = collection_name
+        self.read = 0
+        self.written = 0
+        self.existing = 0  # Already loaded by an earlier run, left as they are
+        self.rejected = []  # (position, reason)
+        self.seconds = 0.0
 
-# Step 1: Connect to MongoDB
-client = MongoClient("mongodb://localhost:27017/")  # Replace with your connection string if needed
-db = client["finace_app"]  # Replace with your database name
+    def report(self):
+        rate = self.written / self.seconds if self.seconds else 0
+        line = (f"'{self.collection_name}': {self.written} of {self.read} records written, "
+                f"{self.existing} already present, {len(self.rejected)} rejected "
+                f"in {self.seconds:.2f}s ({rate:.0f} docs/sec)")
+        for position, reason in self.rejected[:10]:
+            line += f"\n    record {position}: {reason}"
+        if len(self.rejected) > 10:
+            line += f"\n    ... and {len(self.rejected) - 10} more"
+        return line
 
-# Step 2: Define the directory containing JSON files
-data_directory = "data"  # Replace with the path to your JSON files
 
-# Step 3: Iterate through all JSON files in the directory
-for filename in os.listdir(data_directory):
-    if filename.endswith(".json"):  # Process only JSON files
-        file_path = os.path.join(data_directory, filename)
-        collection_name = filename.split(".")[0]  # Use the file name as the collection name
-        collection = db[collection_name]
+def iter_json_values(f):
+    # Yields the values of a top-level JSON array, a single JSON document, or concatenated
+    # documents, without holding more than one chunk plus one document in memory
+    buffer, pos, eof = "", 0, False
+    in_array = None  # Unknown until the first non-blank character
+    expect = "value"  # Inside an array: "first" (a value or ]), "value" or "separator" (, or ])
+    while True:
+        pos = WHITESPACE.match(buffer, pos).end()
+        if pos < len(buffer):
+            char = buffer[pos]
+            if in_array is None:
+                in_array = char == "["
+                if in_array:
+                    pos += 1
+                    expect = "first"
+                    continue
+            if in_array and (expect == "separator" or (expect == "first" and char == "]")):
+                if char == "]":
+                    return
+                if char != ",":
+                    raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+                pos += 1
+                expect = "value"
+                continue
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # A value running to the end of the buffer may go on in the next chunk (123|456)
+                if end < len(buffer) or eof:
+                    pos = end
+                    expect = "separator"
+                    yield value
+                    continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+        elif eof:
+            if in_array:
+                raise json.JSONDecodeError("Unterminated array", buffer, pos)
+            return
+
+        # Need more input: keep only the unparsed tail and append the next chunk
+        chunk = f.read(READ_CHUNK_SIZE)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
 
-        # Step 4: Load the JSON file
-        with open(file_path, 'r') as f:
+
+def iter_ndjson(f):
+    for line in f:
+        if line.strip():
             try:
-                data = json.load(f)
+                yield json.loads(line)
             except json.JSONDecodeError as e:
-                print(f"Error decoding JSON from file {filename}: {e}")
-                continue
+                yield e
+
 
-        # Step 5: Ensure the data is not empty
-        if not data:
-            print(f"The file {filename} is empty or improperly formatted. Skipping...")
-            continue
+def coerce_ids(batch, fields=ID_FIELDS):
+    # Convert _id/userId strings that are valid ObjectIds; anything else is kept as-is
+    for field in fields:
+        for document in batch:
+            value = document.get(field)
+            if isinstance(value, str) and ObjectId.is_valid(value):
+                document[field] = ObjectId(value)
 
-        # Step 6: Insert the data into the collection
+
+def record_id(collection_name, position):
+    # The record at the same position of the same file always gets the same _id
+    return ObjectId(hashlib.sha1(f"{collection_name}:{position}".encode()).digest()[:12])
+
+
+def write_batch(collection, batch, positions, stats, coerce_fields=ID_FIELDS):
+    for document, position in zip(batch, positions):
+        if "_id" not in document:
+            document["_id"] = record_id(collection.name, position)
+    coerce_ids(batch, coerce_fields)
+    operations = [
+        UpdateOne(
+            {"_id": document["_id"]},
+            # $setOnInsert can't be empty; a record holding nothing but its _id sets just that
+            {"$setOnInsert": {field: value for field, value in document.items() if field != "_id"} or
+                             {"_id": document["_id"]}},
+            upsert=True
+        )
+        for document in batch
+    ]
+    try:
+        result = collection.bulk_write(operations, ordered=False)
+        stats.written += result.upserted_count
+        stats.existing += result.matched_count
+    except BulkWriteError as e:
+        details = e.details
+        stats.written += details["nUpserted"]
+        stats.existing += details["nMatched"]
+        for error in details["writeErrors"]:
+            stats.rejected.append((positions[error["index"]], error["errmsg"]))
+
+
+def load_file(db, file_path, batch_size, coerce_fields=ID_FIELDS):
+    collection_name = os.path.splitext(os.path.basename(file_path))[0]
+    stats = Stats(collection_name)
+    started = time.perf_counter()
+
+    with open(file_path, "r") as f:
+        values = iter_ndjson(f) if file_path.endswith((".ndjson", ".jsonl")) else iter_json_values(f)
+        batch, positions = [], []
         try:
-            if isinstance(data, list):  # Check if data is a list of documents
-                for document in data:
-                    # Convert _id to ObjectId if it exists
-                    if "_id" in document:
-                        try:
-                            document["_id"] = ObjectId(document["_id"])
-                        except Exception as e:
-                            print(f"Invalid _id format in document: {document}. Error: {e}")
-                            continue  # Skip invalid _id entries
-
-                    # Convert userId to ObjectId if it exists
-                    if "userId" in document:
-                        try:
-                            document["userId"] = ObjectId(document["userId"])
-                        except Exception as e:
-                            print(f"Invalid userId format in document: {document}. Error: {e}")
-                            continue  # Skip invalid userId entries
-
-                result = collection.insert_many(data)
-                print(f"Inserted {len(result.inserted_ids)} records into the '{collection_name}' collection.")
-            elif isinstance(data, dict):  # Check if data is a single document
-                # Convert _id to ObjectId if it exists
-                if "_id" in data:
-                    try:
-                        data["_id"] = ObjectId(data["_id"])
-                    except Exception as e:
-                        print(f"Invalid _id format in document: {data}. Error: {e}")
-                        continue  # Skip invalid _id entries
-
-                # Convert userId to ObjectId if it exists
-                if "userId" in data:
-                    try:
-                        data["userId"] = ObjectId(data["userId"])
-                    except Exception as e:
-                        print(f"Invalid userId format in document: {data}. Error: {e}")
-                        continue  # Skip invalid userId entries
-
-                result = collection.insert_one(data)
-                print(f"Inserted 1 record into the '{collection_name}' collection.")
-            else:
-                print(f"Invalid data format in file {filename}. Skipping...")
-        except Exception as e:
-            print(f"Error inserting data into collection '{collection_name}': {e}")
\ No newline at end of file
+            for value in values:
+                stats.read += 1
+                if isinstance(value, json.JSONDecodeError):
+                    stats.rejected.append((stats.read, f"Invalid JSON: {value}"))
+                    continue
+                if not isinstance(value, dict):
+                    stats.rejected.append((stats.read, "Not a JSON object"))
+                    continue
+                batch.append(value)
+                positions.append(stats.read)
+                if len(batch) == batch_size:
+                    write_batch(db[collection_name], batch, positions, stats, coerce_fields)
+                    batch, positions = [], []
+        except json.JSONDecodeError as e:
+            stats.rejected.append((stats.read + 1, f"Invalid JSON, stopped reading file: {e}"))
+        if batch:
+            write_batch(db[collection_name], batch, positions, stats, coerce_fields)
+
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load JSON/NDJSON files into MongoDB collections")
+    parser.add_argument("data_directory", nargs="?", default="data")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--db", default="finace_app")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--coerce-fields", default=",".join(ID_FIELDS),
+                        help="Comma-separated fields whose ObjectId-shaped strings become ObjectIds")
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri)
+    db = client[args.db]
+    files = [
+        os.path.join(args.data_directory, filename)
+        for filename in sorted(os.listdir(args.data_directory))
+        if filename.endswith((".json", ".ndjson", ".jsonl"))
+    ]
+
+    coerce_fields = [field for field in args.coerce_fields.split(",") if field]
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for stats in pool.map(lambda path: load_file(db, path, args.batch_size, coerce_fields), files):
+            print(stats.report())
@@ -41,6 +41,9 @@ class _DashboardPageState extends State<DashboardPage> {
   String _selectedPlan = 'Monthly';
   final Map<String, double> _plans = {'Daily': 0.0, 'Weekly': 0.0, 'Monthly': 0.0};
   static const String _baseUrl = "http://10.0.2.2:5000";
+  // Analytics bucket holding the selected plan's period, e.g. this month for 'Monthly'
+  static const Map<String, String> _planGranularity = {'Daily': 'day', 'Weekly': 'week', 'Monthly': 'month'};
+  int _expensesGeneration = 0; // Bumped on every fetch, so an older response is dropped
   Map<String, String> _userData = {'name': 'John Doe', 'email': 'john.doe@example.com'};
   Map<String, List<double>> _expenseTrends = {};
 
@@ -65,21 +68,27 @@ class _DashboardPageState extends State<DashboardPage> {
   }
 
   Future<void> _fetchExpenses() async {
+    final int generation = ++_expensesGeneration;
     try {
-      final response = await http.get(Uri.parse('$_baseUrl/transactions?user_id=user123')); // Add user_id
-      if (response.statusCode == 200) {
-        final List<dynamic> data = json.decode(response.body);
-        final Map<String, double> updatedExpenses = {for (var cat in _defaultCategories) cat: 0.0};
-        for (var item in data) {
-          final String category = item['category'];
-          final double amount = (item['amount'] as num).toDouble();
-          updatedExpenses[category] = (updatedExpenses[category] ?? 0.0) + amount;
+      // Category totals for the selected plan's period, summed on the server; from= today
+      // selects just the bucket that contains it
+      final String today = DateTime.now().toUtc().toIso8601String().substring(0, 10);
+      final response = await http.get(Uri.parse(
+          '$_baseUrl/analytics/spending?user_id=user123&granularity=${_planGranularity[_selectedPlan]}' // Add user_id
+          '&group_by=category&from=$today'));
+      if (response.statusCode != 200 || generation != _expensesGeneration) return;
+      final Map<String, dynamic> data = json.decode(response.body);
+      final Map<String, double> updatedExpenses = {for (var cat in _defaultCategories) cat: 0.0};
+      for (var bucket in data['buckets']) {
+        for (var group in bucket['groups']) {
+          final String category = group['key'];
+          updatedExpenses[category] = (updatedExpenses[category] ?? 0.0) + (group['total'] as num).toDouble();
         }
-        setState(() {
-          _expenses.clear();
-          _expenses.addAll(updatedExpenses);
-        });
       }
+      setState(() {
+        _expenses.clear();
+        _expenses.addAll(updatedExpenses);
+      });
     } catch (e) {
       ScaffoldMessenger.of(context).showSnackBar(SnackBar(content: Text('Failed to fetch expenses: $e')));
     }
@@ -410,7 +419,7 @@ class _DashboardPageState extends State<DashboardPage> {
           children: [
             const Icon(Icons.account_balance_wallet, size: 50, color: Colors.white),
             const SizedBox(height: 16),
-            const Text('Total Expenses', style: TextStyle(fontSize: 20, fontWeight: FontWeight.w600, color: Colors.white70)),
+            Text('Total Expenses ($_selectedPlan)', style: const TextStyle(fontSize: 20, fontWeight: FontWeight.w600, color: Colors.white70)),
             const SizedBox(height: 10),
             Text('Rs. ${totalExpenses.toStringAsFixed(2)}', style: const TextStyle(fontSize: 36, fontWeight: FontWeight.bold, color: Colors.white)),
             if (budget > 0) ...[
@@ -490,7 +499,10 @@ class _DashboardPageState extends State<DashboardPage> {
                 DropdownButton<String>(
                   value: _selectedPlan,
                   items: _plans.keys.map((plan) => DropdownMenuItem(value: plan, child: Text(plan, style: const TextStyle(fontWeight: FontWeight.bold)))).toList(),
-                  onChanged: (value) => setState(() => _selectedPlan = value!),
+                  onChanged: (value) {
+                    setState(() => _selectedPlan = value!);
+                    _fetchExpenses();
+                  },
                   style: const TextStyle(fontSize: 18, color: Color(0xFF526D96)),
                   underline: const SizedBox(),
                   icon: const Icon(Icons.arrow_drop_down, color: Color(0xFFEF9587)),
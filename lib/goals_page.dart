@@ -33,6 +33,9 @@ class _GoalsPageState extends State<GoalsPage> {
 
   static const String _baseUrl = "http://10.0.2.2:5000"; // Adjust based on your Flask server
   final String _userId = "user123"; // Replace with actual user ID after login
+  // Kept across visits to the page
+  static String? _goalsEtag;
+  static String? _goalsBody;
 
   @override
   void initState() {
@@ -42,9 +45,17 @@ class _GoalsPageState extends State<GoalsPage> {
 
   Future<void> _fetchGoals() async {
     try {
-      final response = await http.get(Uri.parse('$_baseUrl/goals?user_id=$_userId'));
+      // Revalidate with the last ETag so an unchanged list comes back as an empty 304
+      final response = await http.get(
+        Uri.parse('$_baseUrl/goals?user_id=$_userId'),
+        headers: {if (_goalsEtag != null) 'If-None-Match': _goalsEtag!},
+      );
       if (response.statusCode == 200) {
-        final List<dynamic> data = json.decode(response.body);
+        _goalsEtag = response.headers['etag'];
+        _goalsBody = response.body;
+      }
+      if (response.statusCode == 200 || (response.statusCode == 304 && _goalsBody != null)) {
+        final List<dynamic> data = json.decode(_goalsBody!);
         setState(() {
           _goals.clear();
           _goals.addAll(data.map((goal) => FinancialGoal.fromJson(goal)).toList());
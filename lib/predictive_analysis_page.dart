@@ -16,6 +16,9 @@ class _PredictiveAnalysisPageState extends State<PredictiveAnalysisPage> {
   Map<String, Map<String, double>> _predictions = {};
   Map<String, String> _suggestions = {};
   bool _isLoading = true;
+  // Kept across visits to the page
+  static String? _cachedEtag;
+  static String? _cachedBody;
 
   @override
   void initState() {
@@ -26,9 +29,17 @@ class _PredictiveAnalysisPageState extends State<PredictiveAnalysisPage> {
   Future<void> _fetchPredictiveAnalysis() async {
     setState(() => _isLoading = true);
     try {
-      final response = await http.get(Uri.parse('$_baseUrl/predictive-analysis?user_id=$_userId'));
-      if (response.statusCode == 200) {
-        final data = json.decode(response.body);
+      // Revalidate with the last ETag so an unchanged analysis comes back as an empty 304
+      final response = await http.get(
+        Uri.parse('$_baseUrl/predictive-analysis?user_id=$_userId'),
+        headers: {if (_cachedEtag != null) 'If-None-Match': _cachedEtag!},
+      );
+      if (response.statusCode == 200 || (response.statusCode == 304 && _cachedBody != null)) {
+        if (response.statusCode == 200) {
+          _cachedEtag = response.headers['etag'];
+          _cachedBody = response.body;
+        }
+        final data = json.decode(_cachedBody!);
         setState(() {
           _predictions = Map<String, Map<String, double>>.from(
             data['predictions'].map((k, v) => MapEntry(k, Map<String, double>.from(v))),